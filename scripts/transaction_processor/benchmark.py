@@ -0,0 +1,894 @@
+"""
+Micro-benchmarks for the transaction processor.
+
+Usage:
+  python benchmark.py classifier [--rows 200000]
+  python benchmark.py conversion [--groups 100000] [--targets 24]
+  python benchmark.py grouping [--rows 500000] [--groups 100000]
+  python benchmark.py spill [--rows 500000] [--groups 400000] [--budget-mb 16]
+  python benchmark.py periods [--rows 500000]
+  python benchmark.py daterange [--rows 1000000] [--years 3]
+  python benchmark.py archive [--rows 1000000]
+  python benchmark.py sheets [--rows 5000] [--changes 10] [--chunk-rows 1000] [--latency 0.05] [--fail-rate 0.1]
+  python benchmark.py sheets-client
+  python benchmark.py startup [--max-ms 400]
+  python benchmark.py ingest [--files 24] [--rows 50000] [--workers N] [--chunk-mb 32]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import stat
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from itertools import chain
+
+from main import (
+    AMOUNT_DECIMALS,
+    GROUP_MEMORY_ESTIMATE_BYTES,
+    PERIOD_KEY_SEPARATOR,
+    SHEETS_SCOPES,
+    DateRangeIndex,
+    GroupSpill,
+    GroupStore,
+    GroupedTransaction,
+    IngestOptions,
+    Period,
+    SheetsClient,
+    TransactionRecord,
+    TransferClassifier,
+    _convert_currency_amounts_python,
+    _write_sheet_diff,
+    _write_sheet_rewrite,
+    aggregate_in_parallel,
+    convert_currency_amounts,
+    export_batches_to_csv,
+    export_to_csv,
+    filter_external_transactions,
+    plan_ingest_tasks,
+    write_transaction_archive,
+    group_transactions_by_description,
+    rollup_periods,
+)
+
+CONVERSION_CURRENCIES = [
+    "USD", "EUR", "PLN", "BYN", "GBP", "CHF", "CZK", "SEK", "NOK", "DKK", "HUF", "RON",
+    "TRY", "UAH", "GEL", "JPY", "CNY", "CAD", "AUD", "NZD", "SGD", "HKD", "ILS", "AED",
+]
+
+CLASSIFIER_FIXTURES = [
+    ("EXCHANGE", "Exchanged to EUR"),
+    ("EXCHANGE", "Exchange to PLN"),
+    ("TRANSFER", "To PLN"),
+    ("TRANSFER", "to pln"),
+    ("TRANSFER", "To PLN Savings"),
+    ("TRANSFER", "To EUR Savings EUR"),
+    ("TRANSFER", "  To USD  "),
+    ("TRANSFER", "To PLNX"),
+    ("TRANSFER", "To John Smith"),
+    ("TRANSFER", "Exchange to USD"),
+    ("TRANSFER", "Exchange to US Dollars"),
+    ("TRANSFER", "Pocket withdrawal"),
+    ("TRANSFER", "Vault top-up"),
+    ("TRANSFER", "Travel GOALS"),
+    ("TRANSFER", "Transfer to JOHN DOE"),
+    ("TRANSFER", "Transfer from Revolut user"),
+    ("TRANSFER", "Payment from Acme Corp"),
+    ("TRANSFER", ""),
+    ("CARD_PAYMENT", "To PLN"),
+    ("CARD_PAYMENT", "Savings bank fee"),
+    ("CARD_PAYMENT", "Glovo"),
+    ("CARD_PAYMENT", "Spotify"),
+    ("PAYMENT", "T-Mobile"),
+    ("TOPUP", "Top-up by *1234"),
+    ("CASH_WITHDRAWAL", "Cash at Euronet"),
+]
+
+
+def legacy_is_internal_transfer(transaction) -> bool:
+    """Reference copy of the original per-call implementation, kept for verdict parity checks."""
+    if transaction.type == "EXCHANGE":
+        return True
+
+    if transaction.type != "TRANSFER":
+        return False
+
+    internal_patterns = [
+        r'^To\s+[A-Z]{3}(\s+Savings)?(\s+[A-Z]{3})?$',
+        r'^Exchange\s+to\s+[A-Z]{3}$',
+    ]
+
+    description = transaction.description.strip()
+
+    for pattern in internal_patterns:
+        if re.match(pattern, description, re.IGNORECASE):
+            return True
+
+    internal_keywords = ['savings', 'pocket', 'vault', 'goals']
+    description_lower = description.lower()
+    if any(keyword in description_lower for keyword in internal_keywords):
+        return True
+
+    if re.match(r'^To\s+[A-Z]{3}$', description):
+        return True
+
+    return False
+
+
+def _record(transaction_type: str, description: str) -> TransactionRecord:
+    return TransactionRecord(transaction_type, "Current", "", "", description, 0.0, 0.0, "PLN", "COMPLETED", 0.0)
+
+
+def _classifier_corpus(rows: int) -> list[TransactionRecord]:
+    rng = random.Random(42)
+    fixtures = [_record(*fixture) for fixture in CLASSIFIER_FIXTURES]
+    unique_merchants = [_record("CARD_PAYMENT", f"Merchant {i}") for i in range(500)]
+    unique_transfers = [_record("TRANSFER", f"Transfer to Person {i}") for i in range(500)]
+    pool = fixtures + unique_merchants + unique_transfers
+    return fixtures + [rng.choice(pool) for _ in range(rows - len(fixtures))]
+
+
+def _rows_per_second(classify, corpus: list[TransactionRecord]) -> float:
+    start = time.perf_counter()
+    for transaction in corpus:
+        classify(transaction)
+    return len(corpus) / (time.perf_counter() - start)
+
+
+def benchmark_classifier(rows: int) -> int:
+    corpus = _classifier_corpus(rows)
+    classifier = TransferClassifier()
+
+    mismatches = [t for t in corpus if legacy_is_internal_transfer(t) != classifier.is_internal(t)]
+    if mismatches:
+        for t in mismatches[:10]:
+            print(f"MISMATCH: type={t.type!r} description={t.description!r}")
+        return 1
+
+    legacy = _rows_per_second(legacy_is_internal_transfer, corpus)
+    compiled = _rows_per_second(TransferClassifier().is_internal, corpus)
+    print(f"Verdicts identical on {len(corpus)} rows ({len(CLASSIFIER_FIXTURES)} fixtures)")
+    print(f"legacy is_internal_transfer: {legacy:,.0f} rows/sec")
+    print(f"TransferClassifier:          {compiled:,.0f} rows/sec ({compiled / legacy:.1f}x)")
+    return 0
+
+
+def _conversion_store(groups: int, source_currencies: list[str], rng: random.Random) -> GroupStore:
+    store = GroupStore()
+    for i in range(groups):
+        description = f"Group {i}"
+        for currency in rng.sample(source_currencies, rng.choice([1, 1, 1, 2, 3])):
+            store.add(description, description, currency, round(rng.uniform(-5000, 5000), 2))
+    return store
+
+
+def benchmark_conversion(groups: int, targets: int) -> int:
+    rng = random.Random(7)
+    target_currencies = CONVERSION_CURRENCIES[:targets]
+    usd_rates = {currency: 1.0 if currency == "USD" else rng.uniform(0.1, 150) for currency in CONVERSION_CURRENCIES}
+    python_store = _conversion_store(groups, CONVERSION_CURRENCIES[:6], random.Random(8))
+    vectorized_store = _conversion_store(groups, CONVERSION_CURRENCIES[:6], random.Random(8))
+
+    start = time.perf_counter()
+    _convert_currency_amounts_python(python_store, target_currencies, usd_rates)
+    python_seconds = time.perf_counter() - start
+    expected = [column.tolist() for column in python_store.converted]
+
+    start = time.perf_counter()
+    convert_currency_amounts(vectorized_store, target_currencies, usd_rates)
+    vectorized_seconds = time.perf_counter() - start
+    actual = [column.tolist() for column in vectorized_store.converted]
+
+    mismatches = [
+        (index, currency)
+        for currency, expected_column, actual_column in zip(target_currencies, expected, actual)
+        for index, (a, b) in enumerate(zip(expected_column, actual_column)) if a != b
+    ]
+    if mismatches:
+        for index, currency in mismatches[:5]:
+            print(f"MISMATCH group {index} {currency}")
+        print(f"{len(mismatches)} converted cells differ")
+        return 1
+
+    print(f"Converted amounts identical for {groups:,} groups × {len(target_currencies)} target currencies")
+    print(f"per-group loop: {python_seconds:.3f}s")
+    print(f"vectorized:     {vectorized_seconds:.3f}s ({python_seconds / vectorized_seconds:.1f}x)")
+    return 0
+
+
+def legacy_group_transactions(transactions) -> list[GroupedTransaction]:
+    """Reference copy of the dict-of-dicts grouping that built pydantic models per group."""
+    amounts = defaultdict(lambda: defaultdict(float))
+    occurrences = defaultdict(int)
+    for transaction in transactions:
+        amounts[transaction.description][transaction.currency] += transaction.amount
+        occurrences[transaction.description] += 1
+    return [
+        GroupedTransaction(description=description, amounts=dict(by_currency), occurrences=occurrences[description])
+        for description, by_currency in amounts.items()
+    ]
+
+
+def _measure(function, *args) -> tuple[object, float, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, seconds, retained
+
+
+def benchmark_grouping(rows: int, groups: int) -> int:
+    rng = random.Random(11)
+    descriptions = [f"Merchant {i}" for i in range(groups)]
+    corpus = [
+        TransactionRecord("CARD_PAYMENT", "Current", "", "2024-01-01", rng.choice(descriptions),
+                          -rng.randint(1, 10_000) / 100, 0.0, rng.choice(["PLN", "PLN", "EUR", "USD"]), "COMPLETED", 0.0)
+        for _ in range(rows)
+    ]
+
+    legacy, legacy_seconds, legacy_bytes = _measure(legacy_group_transactions, corpus)
+    store, store_seconds, store_bytes = _measure(group_transactions_by_description, corpus)
+
+    grouped = store.to_grouped_transactions()
+    def snapshot(groups: list[GroupedTransaction]) -> list[tuple]:
+        return [(g.description, {c: round(a, AMOUNT_DECIMALS) for c, a in g.amounts.items()}, g.occurrences) for g in groups]
+
+    # GroupStore sums exact fixed-point amounts, the legacy grouping kept raw float sums
+    if snapshot(legacy) != snapshot(grouped):
+        print("MISMATCH between legacy grouping and GroupStore")
+        return 1
+
+    print(f"Identical aggregates for {rows:,} rows into {len(store):,} groups")
+    print(f"pydantic groups: {legacy_seconds:.3f}s, {legacy_bytes / len(store):,.0f} bytes/group")
+    print(f"GroupStore:      {store_seconds:.3f}s, {store_bytes / len(store):,.0f} bytes/group")
+    return 0
+
+
+def benchmark_spill(rows: int, groups: int, budget_mb: float) -> int:
+    rates = {"EUR": 0.92, "PLN": 3.95}
+    targets = ["EUR", "PLN", "USD"]
+
+    def corpus():
+        rng = random.Random(13)
+        for _ in range(rows):
+            day = date(2024, 1, 1) + timedelta(days=rng.randrange(366))
+            yield TransactionRecord("CARD_PAYMENT", "Current", f"{day} 10:00:00", f"{day} 10:00:00", f"Merchant {rng.randrange(groups)}",
+                                    -rng.randint(1, 10_000) / 100, 0.0, rng.choice(["PLN", "EUR", "USD"]), "COMPLETED", 0.0)
+
+    def in_memory(directory: str) -> int:
+        store = group_transactions_by_description(corpus(), track_periods=True)
+        convert_currency_amounts(store, targets, rates)
+        export_to_csv(store.to_grouped_transactions(), os.path.join(directory, "groups.csv"))
+        rollup = convert_currency_amounts(rollup_periods(store, Period.MONTH), targets, rates)
+        labels = [key.split(PERIOD_KEY_SEPARATOR, 1)[0] for key in rollup.keys]
+        export_to_csv(rollup.to_grouped_transactions(), os.path.join(directory, "months.csv"), labels)
+        return len(store)
+
+    def spilled(directory: str) -> int:
+        spill = group_transactions_by_description(corpus(), max_groups=max_groups, track_periods=True)
+        if not isinstance(spill, GroupSpill):
+            return 0
+
+        def batches(table: str = GroupSpill.RESULT, periods: bool = False):
+            for batch in spill.batches(table):
+                convert_currency_amounts(batch, targets, rates)
+                labels = [key.split(PERIOD_KEY_SEPARATOR, 1)[0] for key in batch.keys] if periods else None
+                yield batch.to_grouped_transactions(), labels
+
+        export_batches_to_csv(batches(), os.path.join(directory, "groups.csv"))
+        export_batches_to_csv(batches(spill.rollup(Period.MONTH), periods=True), os.path.join(directory, "months.csv"))
+        spill.close()
+        return len(spill)
+
+    def peak(function, *args) -> tuple[object, float, int]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return result, seconds, peak_bytes
+
+    max_groups = max(1, int(budget_mb * 1024 * 1024 / GROUP_MEMORY_ESTIMATE_BYTES))
+    # Both runs group, convert and export the groups and a monthly breakdown end to end
+    with tempfile.TemporaryDirectory() as memory_directory, tempfile.TemporaryDirectory() as spill_directory:
+        group_count, memory_seconds, memory_peak = peak(in_memory, memory_directory)
+        spilled_count, spill_seconds, spill_peak = peak(spilled, spill_directory)
+        if not spilled_count:
+            print(f"{group_count:,} groups fit in {max_groups:,} resident groups, nothing was spilled")
+            return 1
+        for name in ("groups.csv", "months.csv"):
+            with open(os.path.join(memory_directory, name), "rb") as expected, open(os.path.join(spill_directory, name), "rb") as actual:
+                if expected.read() != actual.read():
+                    print(f"MISMATCH between in-memory and spilled {name}")
+                    return 1
+
+    print(f"Identical exports for {rows:,} rows into {group_count:,} groups")
+    print(f"in memory:              {memory_seconds:.2f}s, peak {memory_peak / 1e6:,.1f} MB")
+    print(f"spill at {max_groups:,} groups: {spill_seconds:.2f}s, peak {spill_peak / 1e6:,.1f} MB")
+    if spill_peak >= memory_peak:
+        print("FAIL: spilling did not lower peak memory")
+        return 1
+    return 0
+
+
+class FakeSheetsService:
+    """
+    In-memory stand-in for the googleapiclient Sheets service.
+
+    Implements the calls used by the Sheets writers, applies them to a single
+    spreadsheet held as lists of rows and records every request with its
+    payload size so write strategies can be compared offline. Each request
+    sleeps for latency seconds and range writes fail with fail_rate probability
+    to exercise chunk retries. Writes past the grid size are rejected like the
+    real API does.
+    """
+
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0, seed: int = 3):
+        self.sheets: dict[str, dict] = {}
+        self.requests: list[tuple[str, int]] = []
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.failures = 0
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return FakeSheetsValues(self)
+
+    def _call(self, name: str, body, apply=lambda: None, result=None):
+        return FakeRequest(self, name, len(json.dumps(body or {})), apply, result)
+
+    def _sheet_by_id(self, sheet_id: int) -> dict:
+        return next(sheet for sheet in self.sheets.values() if sheet['properties']['sheetId'] == sheet_id)
+
+    def get(self, spreadsheetId, fields=None):
+        return self._call('get', None, result=lambda: {'sheets': [{'properties': sheet['properties']} for sheet in self.sheets.values()]})
+
+    def batchUpdate(self, spreadsheetId, body):
+        return self._call('batchUpdate', body, lambda: self._apply_batch(body['requests']))
+
+    def _apply_batch(self, requests: list[dict]):
+        for request in requests:
+            (kind, payload), = request.items()
+            if kind == 'addSheet':
+                grid = {'rowCount': 1000, 'columnCount': 26, **payload['properties'].get('gridProperties', {})}
+                properties = {'sheetId': len(self.sheets), **payload['properties'], 'gridProperties': grid}
+                self.sheets[properties['title']] = {'properties': properties, 'rows': []}
+            elif kind == 'appendDimension':
+                grid = self._sheet_by_id(payload['sheetId'])['properties']['gridProperties']
+                grid['rowCount' if payload['dimension'] == 'ROWS' else 'columnCount'] += payload['length']
+            elif kind == 'updateCells':
+                sheet = self._sheet_by_id(payload['start']['sheetId'])
+                for offset, row in enumerate(payload['rows']):
+                    _set_row(sheet, payload['start']['rowIndex'] + offset, _cells_to_values(row))
+            elif kind == 'appendCells':
+                sheet = self._sheet_by_id(payload['sheetId'])
+                rows = [_cells_to_values(row) for row in payload['rows']]
+                sheet['rows'].extend(rows)
+                grid = sheet['properties']['gridProperties']
+                grid['rowCount'] = max(grid['rowCount'], len(sheet['rows']))
+            elif kind == 'deleteDimension':
+                sheet = self._sheet_by_id(payload['range']['sheetId'])
+                start, end = payload['range']['startIndex'], payload['range']['endIndex']
+                del sheet['rows'][start:end]
+                sheet['properties']['gridProperties']['rowCount'] -= end - start
+            else:
+                raise ValueError(f"Unsupported request {kind}")
+
+
+class FakeSheetsValues:
+    def __init__(self, service: FakeSheetsService):
+        self.service = service
+
+    def _sheet(self, range_name: str) -> dict:
+        return self.service.sheets[range_name.split('!')[0]]
+
+    def get(self, spreadsheetId, range, valueRenderOption=None):
+        def result():
+            rows = [_trimmed(row) for row in self._sheet(range)['rows']]
+            while rows and not rows[-1]:
+                rows.pop()
+            return {'values': rows}
+        return self.service._call('values.get', None, result=result)
+
+    def clear(self, spreadsheetId, range):
+        return self.service._call('values.clear', None, lambda: self._sheet(range)['rows'].clear())
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        def apply():
+            sheet = self._sheet(range)
+            start = int(range.split('!A')[1]) - 1
+            for offset, row in enumerate(body['values']):
+                _set_row(sheet, start + offset, list(row))
+        return self.service._call('values.update', body, apply)
+
+
+class FakeRequest:
+    def __init__(self, service: FakeSheetsService, name: str, size: int, apply, result):
+        self.service = service
+        self.name = name
+        self.size = size
+        self.apply = apply
+        self.result = result
+
+    def execute(self, http=None):
+        time.sleep(self.service.latency)
+        with self.service.lock:
+            self.service.requests.append((self.name, self.size))
+            if self.name == 'values.update' and self.service.rng.random() < self.service.fail_rate:
+                self.service.failures += 1
+                raise ConnectionError("simulated transient failure")
+            self.apply()
+            return self.result() if self.result else {}
+
+
+def _set_row(sheet: dict, index: int, row: list):
+    if index >= sheet['properties']['gridProperties']['rowCount']:
+        raise ValueError(f"Row {index + 1} exceeds grid limits")
+    rows = sheet['rows']
+    rows.extend([] for _ in range(index + 1 - len(rows)))
+    rows[index] = row
+
+
+def _cells_to_values(row: dict) -> list:
+    values = [next(iter(cell['userEnteredValue'].values()), '') if cell else '' for cell in row['values']]
+    return _trimmed(values)
+
+
+def _trimmed(row: list) -> list:
+    row = list(row)
+    while row and row[-1] == '':
+        row.pop()
+    return row
+
+
+def _sheet_values(rows: int, rng: random.Random) -> list[list]:
+    header = ['Description', 'Amount (EUR, Aggregated)', 'Amount (USD, Aggregated)', 'Occurrences', 'Category', 'Comment']
+    return [header] + [
+        [f"Merchant {i}", round(rng.uniform(-500, 0), 2), round(rng.uniform(-500, 0), 2), rng.randint(1, 20), "Shopping & retail", '']
+        for i in range(rows)
+    ]
+
+
+def benchmark_sheets(rows: int, changes: int, chunk_rows: int, latency: float, fail_rate: float) -> int:
+    rng = random.Random(5)
+    previous = _sheet_values(rows, rng)
+    current = [list(row) for row in previous]
+    for row in rng.sample(current[1:], changes):
+        row[1] = round(row[1] - 10, 2)
+        row[3] += 1
+    del current[1 + rng.randrange(rows - 1)]
+    current.append([f"Merchant {rows}", -12.5, -13.4, 1, "Food & delivery", ''])
+    expected = sorted(map(_trimmed, current[1:]), key=lambda row: row[0])
+
+    results = {}
+    for name, writer, options in (
+        ("unchunked", _write_sheet_rewrite, {'chunk_rows': len(current), 'max_concurrency': 1}),
+        ("chunked", _write_sheet_rewrite, {'chunk_rows': chunk_rows}),
+        ("diff", _write_sheet_diff, {'chunk_rows': chunk_rows}),
+    ):
+        service = FakeSheetsService(latency, fail_rate)
+        writer(service, "file", "Sheet", previous, **options)
+        service.requests.clear()
+        service.failures = 0
+        start = time.perf_counter()
+        writer(service, "file", "Sheet", current, **options)
+        seconds = time.perf_counter() - start
+        sheet = sorted(map(_trimmed, service.sheets["Sheet"]['rows'][1:]), key=lambda row: row[0])
+        if sheet != expected:
+            print(f"MISMATCH: {name} writer left the sheet different from the export")
+            return 1
+        results[name] = (service.requests, service.failures, seconds)
+
+    print(f"Sheet contents identical after a re-export of {rows:,} rows with {changes} changed, 1 added, 1 removed")
+    for name, (requests, failures, seconds) in results.items():
+        writes = [size for kind, size in requests if kind in ('batchUpdate', 'values.update', 'values.clear')]
+        print(f"{name:9} {len(requests)} requests ({len(writes)} writes, {failures} retried), "
+              f"largest {max(writes):,} bytes, {sum(writes):,} bytes written, {seconds:.2f}s")
+    return 0
+
+
+STARTUP_FORBIDDEN_MODULES = ("openai", "googleapiclient", "google.auth", "google.oauth2", "google_auth_httplib2", "httplib2", "httpx", "pyarrow")
+
+
+def _import_times(stderr: str) -> dict[str, tuple[int, int]]:
+    """Parse -X importtime output into module -> (self, cumulative) microseconds."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def _service_account_key() -> str:
+    """PEM private key for a throwaway service account, never sent anywhere."""
+    try:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+    except ImportError:
+        import rsa
+
+        return rsa.newkeys(2048)[1].save_pkcs1().decode()
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                             serialization.NoEncryption()).decode()
+
+
+def benchmark_sheets_client() -> int:
+    from googleapiclient.discovery_cache import get_static_doc
+
+    def refuse_network(*args, **kwargs):
+        raise RuntimeError("network access during the offline Sheets client check")
+
+    email = "offline-check@example.iam.gserviceaccount.com"
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    failures = []
+
+    def check(condition: bool, message: str):
+        print(f"{'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    with tempfile.TemporaryDirectory() as directory:
+        credentials_path = os.path.join(directory, "service_account.json")
+        discovery_path = os.path.join(directory, "sheets_v4_discovery.json")
+        token_cache_path = os.path.join(directory, "google_token.json")
+        with open(credentials_path, "w", encoding="utf-8") as f:
+            json.dump({"type": "service_account", "project_id": "offline-check", "private_key_id": "0",
+                       "private_key": _service_account_key(), "client_email": email, "client_id": "0",
+                       "token_uri": "https://oauth2.googleapis.com/token"}, f)
+        with open(discovery_path, "w", encoding="utf-8") as f:
+            f.write(get_static_doc("sheets", "v4"))
+
+        def write_cache(entry):
+            with open(token_cache_path, "w", encoding="utf-8") as f:
+                json.dump({email: entry}, f)
+
+        original_connect, original_create_connection = socket.socket.connect, socket.create_connection
+        socket.socket.connect, socket.create_connection = refuse_network, refuse_network
+        try:
+            write_cache({"token": "cached-token", "expiry": (now + timedelta(hours=1)).isoformat(), "scopes": SHEETS_SCOPES})
+            start = time.perf_counter()
+            client = SheetsClient(credentials_path, discovery_path, token_cache_path)
+            client.ensure_token()
+            build_ms = (time.perf_counter() - start) * 1000
+            request = client.service.spreadsheets().values().get(spreadsheetId="file", range="Sheet1")
+            check(request.uri.startswith("https://sheets.googleapis.com/v4/spreadsheets/file/values/"),
+                  f"service built from the stored discovery document in {build_ms:.0f}ms")
+            check(client.credentials.token == "cached-token" and client.credentials.valid,
+                  "unexpired cached token reused without minting a new one")
+
+            write_cache({"token": "expiring-token", "expiry": (now + timedelta(minutes=1)).isoformat(), "scopes": SHEETS_SCOPES})
+            client = SheetsClient(credentials_path, discovery_path, token_cache_path)
+            check(client.credentials.token is None, "token close to expiry is not reused")
+
+            for label, entry in [("malformed expiry", {"token": "t", "expiry": "soon", "scopes": SHEETS_SCOPES}),
+                                 ("missing expiry", {"token": "t", "scopes": SHEETS_SCOPES}),
+                                 ("non-string token", {"token": 1, "expiry": (now + timedelta(hours=1)).isoformat(), "scopes": SHEETS_SCOPES}),
+                                 ("non-object entry", "cached-token")]:
+                write_cache(entry)
+                try:
+                    client = SheetsClient(credentials_path, discovery_path, token_cache_path)
+                    check(client.credentials.token is None, f"cache entry with {label} is ignored")
+                except Exception as e:
+                    check(False, f"cache entry with {label} is ignored ({e!r})")
+
+            client.credentials.token = "fresh-token"
+            client.credentials.expiry = now + timedelta(hours=1)
+            client.store_token()
+            check(stat.S_IMODE(os.stat(token_cache_path).st_mode) == 0o600, "token cache is written with 0600 permissions")
+            client = SheetsClient(credentials_path, discovery_path, token_cache_path)
+            check(client.credentials.token == "fresh-token", "stored token is reused by the next client")
+        finally:
+            socket.socket.connect, socket.create_connection = original_connect, original_create_connection
+
+    return 1 if failures else 0
+
+
+def benchmark_startup(max_ms: float) -> int:
+    """Run a CSV-only, offline processor invocation under -X importtime and cap its total import cost."""
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "transactions.csv")
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write("Type,Product,Started Date,Completed Date,Description,Amount,Fee,Currency,State,Balance\n")
+            f.write("CARD_PAYMENT,Current,2024-01-02 10:00:00,2024-01-02 10:00:00,Coffee,-3.50,0.00,EUR,COMPLETED,100\n")
+        fx_cache = os.path.join(directory, "fx.json")
+        with open(fx_cache, "w", encoding="utf-8") as f:
+            json.dump({"USD": {"fetched_at": time.time(), "rates": {"USD": 1.0, "EUR": 0.9, "PLN": 4.0, "BYN": 3.3}}}, f)
+
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"),
+             "--input", input_path, "--output", os.path.join(directory, "out.csv"), "--skip-categorization",
+             "--no-merchant-rules", "--fx-cache", fx_cache, "--offline"],
+            capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        print(result.stdout[-2000:], result.stderr[-2000:])
+        return 1
+
+    times = _import_times(result.stderr)
+    total_ms = sum(self_us for self_us, _ in times.values()) / 1000
+    forbidden = sorted(name for name in times if name.split(".")[0] in STARTUP_FORBIDDEN_MODULES or name.startswith(STARTUP_FORBIDDEN_MODULES))
+    slowest = sorted(times.items(), key=lambda item: item[1][1], reverse=True)[:8]
+
+    print(f"CSV-only run imported {len(times)} modules in {total_ms:.0f}ms (cap {max_ms:.0f}ms)")
+    for name, (_, cumulative_us) in slowest:
+        print(f"  {cumulative_us / 1000:7.1f}ms  {name}")
+    if forbidden:
+        print(f"FAIL: integrations imported on the CSV-only path: {', '.join(forbidden[:10])}")
+        return 1
+    if total_ms > max_ms:
+        print(f"FAIL: import time {total_ms:.0f}ms exceeds {max_ms:.0f}ms")
+        return 1
+    return 0
+
+
+def _write_export(path: str, rows: int, rng: random.Random, blank_lines: bool = False):
+    """Write a synthetic export; with blank_lines, empty lines are scattered in and trail the file."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Type,Product,Started Date,Completed Date,Description,Amount,Fee,Currency,State,Balance\n")
+        for _ in range(rows):
+            kind, description = rng.choice(
+                [("CARD_PAYMENT", f"Merchant {rng.randrange(20_000)}")] * 8
+                + [("CARD_PAYMENT", '"Shop, ""Quoted""\nSecond line"'), ("TRANSFER", "To PLN Savings")]
+            )
+            stamp = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 10:00:00"
+            f.write(f"{kind},Current,{stamp},{stamp},{description},{-rng.randint(1, 100_000) / 100},0.00,"
+                    f"{rng.choice(['PLN', 'EUR', 'USD'])},COMPLETED,0\n")
+            if blank_lines and rng.random() < 0.01:
+                f.write("\n")
+        if blank_lines:
+            f.write("\n")
+
+
+def _aggregate_snapshot(store: GroupStore) -> list[tuple]:
+    return [
+        (description, store.occurrences[index], {c: column[index] for c, column in zip(store.currencies, store.amounts) if column[index]})
+        for index, description in enumerate(store.descriptions)
+    ]
+
+
+def benchmark_periods(rows: int) -> int:
+    rng = random.Random(17)
+    options = IngestOptions(mode="columnar")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "export.csv")
+        _write_export(path, rows, rng)
+
+        def transactions():
+            return filter_external_transactions(options.read(path), options.classifier())
+
+        # A monthly view used to take one full run per month, each re-reading the export
+        start = time.perf_counter()
+        labels = [f"2024-{month:02d}" for month in range(1, 13)]
+        per_month = {label: group_transactions_by_description(t for t in transactions() if t.started_date.startswith(label))
+                     for label in labels}
+        runs_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rollup = rollup_periods(group_transactions_by_description(transactions(), track_periods=True), Period.MONTH)
+        cube_seconds = time.perf_counter() - start
+
+    expected = [(label, *group) for label, store in per_month.items() for group in sorted(_aggregate_snapshot(store))]
+    actual = [(key.split("\x1f", 1)[0], *group) for key, group in zip(rollup.keys, _aggregate_snapshot(rollup))]
+    if sorted(actual) != expected:
+        print("MISMATCH between the monthly rollup and per-month runs")
+        return 1
+
+    print(f"Identical monthly aggregates for {rows:,} rows ({len(rollup):,} description-month rows)")
+    print(f"12 runs, one per month: {runs_seconds:.2f}s")
+    print(f"one pass + rollup:      {cube_seconds:.2f}s ({runs_seconds / cube_seconds:.1f}x)")
+    return 0
+
+
+def benchmark_daterange(rows: int, years: int) -> int:
+    rng = random.Random(19)
+    first_day = date(2022, 1, 1).toordinal()
+    days = sorted(rng.randrange(365 * years) for _ in range(rows))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "history.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("Type,Product,Started Date,Completed Date,Description,Amount,Fee,Currency,State,Balance\n")
+            for day in days:
+                stamp = f"{date.fromordinal(first_day + day).isoformat()} 10:00:00"
+                f.write(f"CARD_PAYMENT,Current,{stamp},{stamp},Merchant {rng.randrange(5_000)},"
+                        f"{-rng.randint(1, 100_000) / 100},0.00,{rng.choice(['PLN', 'EUR', 'USD'])},COMPLETED,0\n")
+
+        middle = date.fromordinal(first_day + 365 * years // 2)
+        since, until = middle.replace(day=1).isoformat(), middle.replace(day=28).isoformat()
+        options = IngestOptions(mode="columnar", since=since, until=until)
+
+        def aggregate(tasks):
+            transactions = chain.from_iterable(options.read(*task) for task in tasks)
+            return group_transactions_by_description(filter_external_transactions(transactions, options.classifier()))
+
+        start = time.perf_counter()
+        scanned = aggregate(plan_ingest_tasks([path], 32 * 1024 * 1024, split=False))
+        scan_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        DateRangeIndex.load(path)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        indexed = aggregate(plan_ingest_tasks([path], 32 * 1024 * 1024, split=False, date_range=(since, until)))
+        indexed_seconds = time.perf_counter() - start
+
+    if _aggregate_snapshot(scanned) != _aggregate_snapshot(indexed):
+        print("MISMATCH between full scan and indexed date range reads")
+        return 1
+
+    print(f"Identical aggregates for {since} – {until} out of {rows:,} rows over {years} years")
+    print(f"full scan:         {scan_seconds:.2f}s")
+    print(f"index build, once: {build_seconds:.2f}s")
+    print(f"indexed read:      {indexed_seconds:.2f}s ({scan_seconds / indexed_seconds:.1f}x)")
+    return 0
+
+
+def benchmark_archive(rows: int) -> int:
+    rng = random.Random(23)
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "history.csv")
+        _write_export(csv_path, rows, rng)
+
+        start = time.perf_counter()
+        archives = {}
+        for extension in ("parquet", "arrow"):
+            archives[extension] = os.path.join(directory, f"history.{extension}")
+            write_transaction_archive([csv_path], archives[extension])
+        convert_seconds = (time.perf_counter() - start) / len(archives)
+
+        results = {}
+        for label, mode, path in [("CSV, pydantic", "pydantic", csv_path), ("CSV, columnar", "columnar", csv_path),
+                                  ("Parquet", "columnar", archives["parquet"]), ("Arrow IPC", "columnar", archives["arrow"])]:
+            options = IngestOptions(mode=mode)
+            start = time.perf_counter()
+            store = group_transactions_by_description(filter_external_transactions(options.read(path), options.classifier()))
+            results[label] = (_aggregate_snapshot(store), time.perf_counter() - start)
+        sizes = {label: os.path.getsize(path) for label, path in [("CSV", csv_path), *archives.items()]}
+
+    baseline, baseline_seconds = results["CSV, pydantic"]
+    mismatched = [label for label, (snapshot, _) in results.items() if snapshot != baseline]
+    if mismatched:
+        print(f"MISMATCH between CSV and {', '.join(mismatched)} aggregates")
+        return 1
+
+    print(f"Identical aggregates for {rows:,} rows; one-off conversion {convert_seconds:.2f}s per archive")
+    print(f"file sizes: {', '.join(f'{label} {size / 1e6:,.1f} MB' for label, size in sizes.items())}")
+    for label, (_, seconds) in results.items():
+        print(f"{label + ':':15} {seconds:.2f}s ({baseline_seconds / seconds:.1f}x)")
+    return 0
+
+
+def benchmark_ingest(files: int, rows: int, workers: int, chunk_mb: int) -> int:
+    rng = random.Random(13)
+    options = IngestOptions(mode="columnar")
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, f"export_{i:03d}.csv") for i in range(files)]
+        for path in paths:
+            _write_export(path, rows, rng)
+        # Blank and trailing blank lines are skipped by both readers
+        blank_path = os.path.join(directory, "export_blank_lines.csv")
+        _write_export(blank_path, min(rows, 20_000), rng, blank_lines=True)
+        paths.append(blank_path)
+        pydantic_options = IngestOptions(mode="pydantic")
+        columnar_blank = group_transactions_by_description(options.read(blank_path))
+        pydantic_blank = group_transactions_by_description(pydantic_options.read(blank_path))
+        if _aggregate_snapshot(columnar_blank) != _aggregate_snapshot(pydantic_blank):
+            print("MISMATCH between columnar and pydantic reads of an export with blank lines")
+            return 1
+
+        start = time.perf_counter()
+        transactions = chain.from_iterable(options.read(path) for path in paths)
+        serial = group_transactions_by_description(filter_external_transactions(transactions, options.classifier()))
+        serial_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tasks = plan_ingest_tasks(paths, chunk_mb * 1024 * 1024)
+        parallel, _ = aggregate_in_parallel(tasks, options, workers)
+        parallel_seconds = time.perf_counter() - start
+
+    if _aggregate_snapshot(serial) != _aggregate_snapshot(parallel):
+        print("MISMATCH between serial and parallel aggregates")
+        return 1
+
+    print(f"Identical aggregates for {files} files × {rows:,} rows and a blank-line export ({len(tasks)} chunks) into {len(serial):,} groups")
+    print(f"serial:              {serial_seconds:.2f}s")
+    print(f"{workers} worker processes: {parallel_seconds:.2f}s ({serial_seconds / parallel_seconds:.1f}x)")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Transaction processor micro-benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    classifier_parser = subparsers.add_parser("classifier", help="Internal transfer classifier throughput and parity")
+    classifier_parser.add_argument("--rows", type=int, default=200_000)
+
+    conversion_parser = subparsers.add_parser("conversion", help="Currency conversion throughput and parity")
+    conversion_parser.add_argument("--groups", type=int, default=100_000)
+    conversion_parser.add_argument("--targets", type=int, default=len(CONVERSION_CURRENCIES))
+
+    grouping_parser = subparsers.add_parser("grouping", help="Grouping throughput and memory per group")
+    grouping_parser.add_argument("--rows", type=int, default=500_000)
+    grouping_parser.add_argument("--groups", type=int, default=100_000)
+
+    spill_parser = subparsers.add_parser("spill", help="Bounded-memory grouping and export with spill-to-disk vs in-memory")
+    spill_parser.add_argument("--rows", type=int, default=500_000)
+    spill_parser.add_argument("--groups", type=int, default=400_000)
+    spill_parser.add_argument("--budget-mb", type=float, default=16)
+
+    periods_parser = subparsers.add_parser("periods", help="Monthly breakdown from the period cube vs one run per month")
+    periods_parser.add_argument("--rows", type=int, default=500_000)
+
+    daterange_parser = subparsers.add_parser("daterange", help="One month of a multi-year export, full scan vs offset index")
+    daterange_parser.add_argument("--rows", type=int, default=1_000_000)
+    daterange_parser.add_argument("--years", type=int, default=3)
+
+    archive_parser = subparsers.add_parser("archive", help="Reprocessing a CSV export vs its Parquet and Arrow archives")
+    archive_parser.add_argument("--rows", type=int, default=1_000_000)
+
+    sheets_parser = subparsers.add_parser("sheets", help="Google Sheets write strategies against an in-memory fake")
+    sheets_parser.add_argument("--rows", type=int, default=5_000)
+    sheets_parser.add_argument("--changes", type=int, default=10)
+    sheets_parser.add_argument("--chunk-rows", type=int, default=1_000)
+    sheets_parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per request")
+    sheets_parser.add_argument("--fail-rate", type=float, default=0.0, help="Probability that a range write fails")
+
+    subparsers.add_parser("sheets-client", help="Offline check of the Sheets client discovery and token caches")
+
+    startup_parser = subparsers.add_parser("startup", help="Import cost of a CSV-only run, fails above the cap")
+    startup_parser.add_argument("--max-ms", type=float, default=400)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Serial vs process-pool ingestion of many CSV files")
+    ingest_parser.add_argument("--files", type=int, default=24)
+    ingest_parser.add_argument("--rows", type=int, default=50_000)
+    ingest_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ingest_parser.add_argument("--chunk-mb", type=int, default=32)
+
+    args = parser.parse_args()
+
+    if args.benchmark == "classifier":
+        return benchmark_classifier(args.rows)
+    if args.benchmark == "conversion":
+        return benchmark_conversion(args.groups, args.targets)
+    if args.benchmark == "grouping":
+        return benchmark_grouping(args.rows, args.groups)
+    if args.benchmark == "spill":
+        return benchmark_spill(args.rows, args.groups, args.budget_mb)
+    if args.benchmark == "periods":
+        return benchmark_periods(args.rows)
+    if args.benchmark == "daterange":
+        return benchmark_daterange(args.rows, args.years)
+    if args.benchmark == "archive":
+        return benchmark_archive(args.rows)
+    if args.benchmark == "sheets":
+        return benchmark_sheets(args.rows, args.changes, args.chunk_rows, args.latency, args.fail_rate)
+    if args.benchmark == "sheets-client":
+        return benchmark_sheets_client()
+    if args.benchmark == "startup":
+        return benchmark_startup(args.max_ms)
+    if args.benchmark == "ingest":
+        return benchmark_ingest(args.files, args.rows, args.workers, args.chunk_mb)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,36 @@
 import argparse
 import asyncio
+import glob
+import hashlib
+import io
+import math
 import json
 import logging
+import mmap
+import multiprocessing
+import os
 import re
+import sqlite3
 import sys
+import threading
 import time
-from collections import defaultdict
-from csv import DictReader, DictWriter
+from array import array
+from datetime import date, datetime, timezone
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager
+from csv import DictReader, DictWriter, reader as csv_reader
 from enum import Enum
-from typing import Annotated
-import httpx
+from itertools import chain, islice, repeat
+from typing import TYPE_CHECKING, Annotated, Any, Awaitable, Callable, Iterable, Iterator, NamedTuple, Sequence
 
-from openai import AsyncOpenAI
 from pydantic import BaseModel, Field, field_validator
-from google.auth.transport.requests import Request
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+
+# httpx, openai and the Google client libraries are imported where they are used,
+# so runs that skip categorization or Sheets export do not pay for loading them
+if TYPE_CHECKING:
+    from google_auth_httplib2 import AuthorizedHttp
+    from openai import AsyncOpenAI
 
 logging.basicConfig(
     level=logging.INFO,
@@ -28,6 +43,52 @@ logger = logging.getLogger(__name__)
 DEFAULT_MODEL = "gpt-4o-mini"
 DEFAULT_OUTPUT_SUFFIX = "_processed.csv"
 DEFAULT_CURRENCIES = ["USD", "EUR", "PLN", "BYN"]
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "transaction-processor")
+DEFAULT_CATEGORY_CACHE = os.path.join(CACHE_DIR, "categories.sqlite")
+DEFAULT_FX_CACHE = os.path.join(CACHE_DIR, "fx_rates.json")
+DEFAULT_SHEETS_DISCOVERY = os.path.join(CACHE_DIR, "sheets_v4_discovery.json")
+DEFAULT_GOOGLE_TOKEN_CACHE = os.path.join(CACHE_DIR, "google_token.json")
+SHEETS_DISCOVERY_URL = "https://sheets.googleapis.com/$discovery/rest?version=v4"
+SHEETS_SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+GOOGLE_TOKEN_MIN_LIFETIME_SECONDS = 300
+DEFAULT_FX_TTL_HOURS = 12
+FX_HISTORY_URL = "https://api.frankfurter.app/{start}..{end}?from=USD"
+DEFAULT_MERCHANT_RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "merchant_rules.json")
+DEFAULT_HISTORY_THRESHOLD = 0.75
+DEFAULT_CACHE_MAX_AGE_DAYS = 180
+DEFAULT_CACHE_MAX_ENTRIES = 50_000
+DEFAULT_CHUNK_SIZE = 150
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_SHEETS_CHUNK_ROWS = 5_000
+DEFAULT_SHEETS_MAX_CONCURRENCY = 4
+DEFAULT_SHEETS_MAX_RETRIES = 3
+COLUMNAR_BATCH_SIZE = 50_000
+DEFAULT_PARSE_CHUNK_MB = 32
+QUOTE_SCAN_BLOCK_BYTES = 16 * 1024 * 1024
+DATE_INDEX_BLOCK_BYTES = 1024 * 1024
+DATE_INDEX_SUFFIX = ".idx.json"
+MANIFEST_SUFFIX = ".manifest.json"
+ARCHIVE_FORMATS = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+ARCHIVE_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+AMOUNT_DECIMALS = 8
+AMOUNT_SCALE = 10 ** AMOUNT_DECIMALS
+GROUP_MEMORY_ESTIMATE_BYTES = 512
+PERIOD_KEY_SEPARATOR = "\x1f"
+MAX_REPORTED_ERRORS = 20
+
+CSV_COLUMNS = {
+    'type': 'Type',
+    'product': 'Product',
+    'started_date': 'Started Date',
+    'completed_date': 'Completed Date',
+    'description': 'Description',
+    'amount': 'Amount',
+    'fee': 'Fee',
+    'currency': 'Currency',
+    'state': 'State',
+    'balance': 'Balance',
+}
 
 Currency = Annotated[str, Field(min_length=3, max_length=3, description="ISO currency code")]
 TransactionDate = Annotated[str, Field(description="Transaction date")]
@@ -45,26 +106,59 @@ class TransactionState(str, Enum):
     FAILED = "FAILED"
     CANCELLED = "CANCELLED"
 
+class IngestMode(str, Enum):
+    PYDANTIC = "pydantic"
+    COLUMNAR = "columnar"
+
+class SheetsMode(str, Enum):
+    REWRITE = "rewrite"
+    DIFF = "diff"
+
+class Period(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+class CategoryCode(str, Enum):
+    PAYMENTS = "PAY"
+    FOOD = "FOOD"
+    SUBSCRIPTIONS = "SUB"
+    GROCERIES = "GROC"
+    ENTERTAINMENT = "ENT"
+    CASHBACK = "BONUS"
+    CASH = "CASH"
+    TELECOM = "TEL"
+    DEVELOPMENT = "DEV"
+    TRANSPORT = "TRANS"
+    HEALTH = "HEALTH"
+    SHOPPING = "SHOP"
+    MISCELLANEOUS = "MISC"
+
+CATEGORIES: dict[CategoryCode, tuple[str, str]] = {
+    CategoryCode.PAYMENTS: ("Electronic payments & donations", "PaySend, DonationAlerts, PayPal, money transfers"),
+    CategoryCode.FOOD: ("Food & delivery", "Glovo, Uber Eats, food delivery services, restaurants"),
+    CategoryCode.SUBSCRIPTIONS: ("Subscriptions & digital services", "YouTube, Spotify, Netflix, OpenAI, Patreon, Viaplay, Toggl, streaming"),
+    CategoryCode.GROCERIES: ("Groceries & household goods", "Auchan, supermarkets, grocery stores, household items"),
+    CategoryCode.ENTERTAINMENT: ("Entertainment", "Cinema, games, entertainment venues, leisure activities"),
+    CategoryCode.CASHBACK: ("Cashback & bonuses", "any cashback, rewards, or bonus payments"),
+    CategoryCode.CASH: ("Cash withdrawals", "ATM withdrawals, cash operations"),
+    CategoryCode.TELECOM: ("Mobile & internet services", "T-Mobile, Netia, telecom, internet providers"),
+    CategoryCode.DEVELOPMENT: ("Tools & development", "JetBrains, GitHub, Midjourney, Figma, CleanShot, Nylas, development tools"),
+    CategoryCode.TRANSPORT: ("Transport", "Uber, taxi, public transport, travel"),
+    CategoryCode.HEALTH: ("Healthcare & wellness", "medical, pharmacy, health services"),
+    CategoryCode.SHOPPING: ("Shopping & retail", "clothing, electronics, general retail"),
+    CategoryCode.MISCELLANEOUS: ("Miscellaneous", "anything that doesn't fit other categories"),
+}
+DEFAULT_CATEGORY = CATEGORIES[CategoryCode.MISCELLANEOUS][0]
+
 CATEGORIZATION_PROMPT = """
-Categorize these transactions based on their descriptions:
-
-Categories to use:
-- Electronic payments & donations (PaySend, DonationAlerts, PayPal, money transfers)
-- Food & delivery (Glovo, Uber Eats, food delivery services, restaurants)
-- Subscriptions & digital services (YouTube, Spotify, Netflix, OpenAI, Patreon, Viaplay, Toggl, streaming)
-- Groceries & household goods (Auchan, supermarkets, grocery stores, household items)
-- Entertainment (Cinema, games, entertainment venues, leisure activities)
-- Cashback & bonuses (any cashback, rewards, or bonus payments)
-- Cash withdrawals (ATM withdrawals, cash operations)
-- Mobile & internet services (T-Mobile, Netia, telecom, internet providers)
-- Tools & development (JetBrains, GitHub, Midjourney, Figma, CleanShot, Nylas, development tools)
-- Transport (Uber, taxi, public transport, travel)
-- Healthcare & wellness (medical, pharmacy, health services)
-- Shopping & retail (clothing, electronics, general retail)
-- Miscellaneous (anything that doesn't fit other categories)
-
-For each transaction, update the "category" field with the most appropriate category.
-Return a JSON array with the same structure but with filled category fields.
+Categorize these transactions based on their descriptions.
+
+Categories to use (code: name - examples):
+""" + "\n".join(f"- {code.value}: {name} - {examples}" for code, (name, examples) in CATEGORIES.items()) + """
+
+Input has one transaction per line: a numeric id, a tab, then the description.
+Return one item per input line with its id and the code of the most appropriate category.
 """
 
 class TransactionRow(BaseModel):
@@ -87,15 +181,31 @@ class TransactionRow(BaseModel):
             return 0.0
         return v
 
+class TransactionRecord(NamedTuple):
+    """Lightweight transaction produced by the columnar reader after bulk validation."""
+    type: str
+    product: str
+    started_date: str
+    completed_date: str
+    description: str
+    amount: float
+    fee: float
+    currency: str
+    state: str
+    balance: float
+    occurrences: int = 1
+
+Transaction = TransactionRow | TransactionRecord
+
 class Transactions(BaseModel):
     transactions: list[TransactionRow] = Field(..., description="List of transaction rows", default_factory=list)
 
-class SimplifiedTransaction(BaseModel):
-    description: str
-    category: str
+class CategorizedItem(BaseModel):
+    id: int
+    code: CategoryCode
 
-class CategorizedTransactions(BaseModel):
-    transactions: list[SimplifiedTransaction] = Field(..., description="List of categorized transactions", default_factory=list)
+class CategorizedItems(BaseModel):
+    items: list[CategorizedItem] = Field(..., description="Category code for each transaction id", default_factory=list)
 
 
 class GroupedTransaction(BaseModel):
@@ -105,63 +215,493 @@ class GroupedTransaction(BaseModel):
     occurrences: Annotated[int, Field(ge=1, description="Number of grouped transactions")]
     category: str = Field(default="", description="Transaction category")
     comment: str = Field(default="", description="Additional comment")
+    original_descriptions: list[str] = Field(default_factory=list, description="Raw descriptions merged into this group by normalization")
 
-def is_internal_transfer(transaction: TransactionRow) -> bool:
+class GroupStore:
     """
-    Detect internal transfers using multiple signals instead of hardcoded text.
-    
+    Compact columnar aggregate of transaction groups used while processing.
+
+    Each group is a row index. Descriptions, categories and comments are parallel
+    lists, occurrences an array('q'), and amounts one array('q') column per
+    currency with currency codes interned to small integers. Amount totals are
+    fixed-point integers in units of 10**-AMOUNT_DECIMALS, so sums are exact and
+    do not depend on the order rows or partial aggregates are added in. Converted
+    amounts are one column per target currency in the same fixed-point units and
+    are rounded to cents on export.
+    Pydantic GroupedTransaction models are only built at the export boundary
+    by to_grouped_transactions().
+
+    With track_periods, periods holds the period cube: a nested store with one
+    row per group and day (keyed "YYYY-MM-DD<separator>group key") that is
+    filled in the same pass and rolled up to any period by rollup_periods().
+    """
+
+    __slots__ = (
+        'keys', 'descriptions', 'occurrences', 'categories', 'comments', 'originals',
+        'currencies', 'currency_codes', 'amounts', 'target_currencies', 'converted', 'periods',
+    )
+
+    def __init__(self, target_currencies: Iterable[str] = (), track_originals: bool = False, track_periods: bool = False):
+        self.keys: dict[str, int] = {}
+        self.descriptions: list[str] = []
+        self.occurrences = array('q')
+        self.categories: list[str] = []
+        self.comments: list[str] = []
+        self.originals: list[dict[str, None]] | None = [] if track_originals else None
+        self.currencies: list[str] = []
+        self.currency_codes: dict[str, int] = {}
+        self.amounts: list[array] = []
+        self.target_currencies = list(target_currencies)
+        self.converted: list[array] = [array('q') for _ in self.target_currencies]
+        self.periods: GroupStore | None = GroupStore(self.target_currencies) if track_periods else None
+
+    def __len__(self) -> int:
+        return len(self.descriptions)
+
+    def currency_code(self, currency: str) -> int:
+        code = self.currency_codes.get(currency)
+        if code is None:
+            code = self.currency_codes[currency] = len(self.currencies)
+            self.currencies.append(currency)
+            self.amounts.append(array('q', bytes(8 * len(self))))
+        return code
+
+    def group_index(self, key: str, description: str) -> int:
+        index = self.keys.get(key)
+        if index is None:
+            index = self.keys[key] = len(self.descriptions)
+            self.descriptions.append(description)
+            self.occurrences.append(0)
+            self.categories.append("")
+            self.comments.append("")
+            if self.originals is not None:
+                self.originals.append({})
+            for column in self.amounts:
+                column.append(0)
+            for column in self.converted:
+                column.append(0)
+        return index
+
+    def add(self, key: str, description: str, currency: str, amount: float, original: str | None = None) -> int:
+        index = self.group_index(key, description)
+        self.amounts[self.currency_code(currency)][index] += round(amount * AMOUNT_SCALE)
+        self.occurrences[index] += 1
+        if original is not None:
+            self.originals[index][original] = None
+        return index
+
+    def merge(self, other: "GroupStore"):
+        """Fold another store's aggregates into this one, appending its new groups in their order."""
+        codes = [self.currency_code(currency) for currency in other.currencies]
+        for other_index, (key, description) in enumerate(zip(other.keys, other.descriptions)):
+            index = self.group_index(key, description)
+            self.occurrences[index] += other.occurrences[other_index]
+            for code, column in zip(codes, other.amounts):
+                self.amounts[code][index] += column[other_index]
+            for column, other_column in zip(self.converted, other.converted):
+                column[index] += other_column[other_index]
+            if self.originals is not None:
+                self.originals[index].update(other.originals[other_index])
+        if self.periods is not None and other.periods is not None:
+            self.periods.merge(other.periods)
+
+    def set_converted(self, target_currencies: list[str], columns: list[array]):
+        self.target_currencies = list(target_currencies)
+        self.converted = columns
+
+    def records(self) -> list["GroupRecord"]:
+        return [GroupRecord(self, index) for index in range(len(self))]
+
+    def to_state(self) -> dict:
+        """Plain JSON-serializable snapshot of every column, restored by from_state()."""
+        return {
+            'keys': list(self.keys),
+            'descriptions': self.descriptions,
+            'occurrences': self.occurrences.tolist(),
+            'categories': self.categories,
+            'comments': self.comments,
+            'originals': [list(originals) for originals in self.originals] if self.originals is not None else None,
+            'amounts': {currency: column.tolist() for currency, column in zip(self.currencies, self.amounts)},
+            'converted': {currency: column.tolist() for currency, column in zip(self.target_currencies, self.converted)},
+            'periods': self.periods.to_state() if self.periods is not None else None,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "GroupStore":
+        store = cls(list(state['converted']), track_originals=state['originals'] is not None)
+        store.keys = {key: index for index, key in enumerate(state['keys'])}
+        store.descriptions = state['descriptions']
+        store.occurrences = array('q', state['occurrences'])
+        store.categories = state['categories']
+        store.comments = state['comments']
+        if state['originals'] is not None:
+            store.originals = [dict.fromkeys(originals) for originals in state['originals']]
+        for currency, column in state['amounts'].items():
+            store.amounts[store.currency_code(currency)] = array('q', column)
+        store.converted = [array('q', column) for column in state['converted'].values()]
+        if state.get('periods') is not None:
+            store.periods = cls.from_state(state['periods'])
+        return store
+
+    def to_grouped_transactions(self) -> list[GroupedTransaction]:
+        return [
+            GroupedTransaction(
+                description=self.descriptions[index],
+                amounts={currency: column[index] / AMOUNT_SCALE for currency, column in zip(self.currencies, self.amounts) if column[index]},
+                converted_amounts={currency: column[index] / AMOUNT_SCALE for currency, column in zip(self.target_currencies, self.converted)},
+                occurrences=self.occurrences[index],
+                category=self.categories[index],
+                comment=self.comments[index],
+                original_descriptions=list(self.originals[index]) if self.originals is not None else []
+            )
+            for index in range(len(self))
+        ]
+
+
+class GroupRecord:
+    """Lightweight view of one GroupStore row exposing description and category for categorization stages."""
+
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store: GroupStore, index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def description(self) -> str:
+        return self.store.descriptions[self.index]
+
+    @property
+    def category(self) -> str:
+        return self.store.categories[self.index]
+
+    @category.setter
+    def category(self, value: str):
+        self.store.categories[self.index] = value
+
+
+class TransferRules(BaseModel):
+    """Internal-transfer detection rules, overridable with a JSON file via --transfer-rules."""
+    internal_types: list[str] = Field(default_factory=lambda: ["EXCHANGE"], description="Types that are always internal")
+    transfer_types: list[str] = Field(default_factory=lambda: ["TRANSFER"], description="Types checked against patterns and keywords")
+    patterns: list[str] = Field(
+        default_factory=lambda: [
+            r'^To\s+[A-Z]{3}(\s+Savings)?(\s+[A-Z]{3})?$',  # "To PLN", "To PLN Savings", "To EUR Savings EUR"
+            r'^Exchange\s+to\s+[A-Z]{3}$',  # "Exchange to PLN"
+        ],
+        description="Case-insensitive regexes matched against the stripped description"
+    )
+    keywords: list[str] = Field(
+        default_factory=lambda: ['savings', 'pocket', 'vault', 'goals'],
+        description="Lowercase substrings that mark a transfer as internal"
+    )
+
+
+class TransferClassifier:
+    """
+    Detect internal transfers with rules compiled once and verdicts memoized.
+
     Internal transfers have these characteristics:
-    1. Type is 'TRANSFER' or 'EXCHANGE'
-    2. Description follows patterns: 'To [CURRENCY] [Savings]', 'Exchange to [CURRENCY]'
-    3. Zero fee for transfers (internal transfers don't have fees)
-    4. Specific patterns in description
+    1. Type is one of internal_types (EXCHANGE) - always internal
+    2. Otherwise the type must be one of transfer_types (TRANSFER)
+    3. Description matches a pattern: 'To [CURRENCY] [Savings]', 'Exchange to [CURRENCY]'
+    4. Or the description contains a keyword: savings, pocket, vault, goals
+
+    All patterns are combined into a single alternation and all keywords into a
+    single regex, so each description is scanned once per rule kind. Verdicts are
+    cached by (type, description) because real exports repeat descriptions heavily.
     """
-    
-    # Rule 1: EXCHANGE operations are always internal
-    if transaction.type == "EXCHANGE":
-        return True
-    
-    # Rule 2: Must be a TRANSFER type for other internal operations
-    if transaction.type != "TRANSFER":
-        return False
-    
-    # Rule 3: Pattern matching for internal transfer descriptions
-    internal_patterns = [
-        r'^To\s+[A-Z]{3}(\s+Savings)?(\s+[A-Z]{3})?$',  # "To PLN", "To PLN Savings", "To EUR Savings EUR"
-        r'^Exchange\s+to\s+[A-Z]{3}$',  # "Exchange to PLN"
-    ]
-    
-    description = transaction.description.strip()
-    
-    for pattern in internal_patterns:
-        if re.match(pattern, description, re.IGNORECASE):
+
+    def __init__(self, rules: TransferRules | None = None):
+        self.rules = rules or TransferRules()
+        self._internal_types = frozenset(self.rules.internal_types)
+        self._transfer_types = frozenset(self.rules.transfer_types)
+        self._pattern_matcher = (
+            re.compile('|'.join(f'(?:{pattern})' for pattern in self.rules.patterns), re.IGNORECASE)
+            if self.rules.patterns else None
+        )
+        self._keyword_matcher = (
+            re.compile('|'.join(re.escape(keyword.lower()) for keyword in self.rules.keywords))
+            if self.rules.keywords else None
+        )
+        self._verdicts: dict[tuple[str, str], bool] = {}
+
+    @classmethod
+    def from_file(cls, path: str) -> "TransferClassifier":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(TransferRules.model_validate_json(f.read()))
+
+    def is_internal(self, transaction: Transaction) -> bool:
+        key = (transaction.type, transaction.description)
+        verdict = self._verdicts.get(key)
+        if verdict is None:
+            verdict = self._verdicts[key] = self._classify(*key)
+        return verdict
+
+    def _classify(self, transaction_type: str, description: str) -> bool:
+        if transaction_type in self._internal_types:
             return True
-    
-    # Rule 4: Additional keywords that indicate internal transfers
-    internal_keywords = ['savings', 'pocket', 'vault', 'goals']
-    description_lower = description.lower()
-    if any(keyword in description_lower for keyword in internal_keywords):
-        return True
-    
-    # Rule 5: Check for transfers between user's own currency accounts
-    # Pattern: "To [CURRENCY]" without "Savings" might still be internal
-    if re.match(r'^To\s+[A-Z]{3}$', description):
-        return True
-    
-    # Rule 6: Transfers from/to other users are external
-    if 'Transfer from Revolut user' in description or 'Transfer to' in description:
+
+        if transaction_type not in self._transfer_types:
+            return False
+
+        description = description.strip()
+
+        if self._pattern_matcher and self._pattern_matcher.match(description):
+            return True
+
+        if self._keyword_matcher and self._keyword_matcher.search(description.lower()):
+            return True
+
+        # Transfers from/to other users ('Transfer from Revolut user', 'Transfer to ...') are external
         return False
-    
-    return False
 
 
-def read_transactions_from_csv(filepath: str) -> list[TransactionRow]:
-    transactions = []
+DEFAULT_TRANSFER_CLASSIFIER = TransferClassifier()
+
+
+def is_internal_transfer(transaction: Transaction) -> bool:
+    """Detect internal transfers using the default rules."""
+    return DEFAULT_TRANSFER_CLASSIFIER.is_internal(transaction)
+
+
+class NormalizationRules(BaseModel):
+    """Tokens stripped from descriptions to derive a canonical merchant key; overridable via --normalization-rules."""
+    strip_patterns: list[str] = Field(
+        default_factory=lambda: [
+            r'\*\s*\d+',  # card suffixes: "Spotify *9117"
+            r'\bcard\s*(?:no\.?\s*)?\d{4}\b',  # "CARD 1234"
+            r'\b\d{4}-\d{2}-\d{2}\b',  # ISO dates
+            r'\b\d{1,2}[./-]\d{1,2}(?:[./-]\d{2,4})?\b',  # "12/03", "12.03.2024"
+            r'#\s*[\w-]*\d[\w-]*',  # "#A1234"
+            r'\b(?:order|ref|inv|invoice)\.?\s*[:#]?\s*[\w-]*\d[\w-]*',  # "Order 98765", "Ref: X12"
+            r'\b[\w-]*\d{5,}[\w-]*',  # long reference numbers
+        ],
+        description="Case-insensitive regexes removed from descriptions"
+    )
+    cities: list[str] = Field(
+        default_factory=lambda: [
+            'Warszawa', 'Warsaw', 'Krakow', 'Kraków', 'Gdansk', 'Gdańsk', 'Wroclaw', 'Wrocław',
+            'Poznan', 'Poznań', 'Lodz', 'Łódź', 'Minsk', 'Vilnius', 'Berlin', 'London', 'Amsterdam', 'Dublin',
+        ],
+        description="City names removed as whole words"
+    )
+
+
+class DescriptionNormalizer:
+    """
+    Collapse near-duplicate descriptions into a canonical merchant name.
+
+    Card suffixes, dates, order numbers and city names are stripped, whitespace
+    and trailing punctuation are collapsed and the result is compared
+    case-insensitively. If the cleaned text starts with a name from the index of
+    known canonical keys, that name is used. Results are memoized per raw description.
+    """
+
+    def __init__(self, rules: NormalizationRules | None = None, known_keys: Iterable[str] = ()):
+        self.rules = rules or NormalizationRules()
+        alternatives = [f'(?:{pattern})' for pattern in self.rules.strip_patterns]
+        if self.rules.cities:
+            alternatives.append(r'\b(?:' + '|'.join(map(re.escape, self.rules.cities)) + r')\b')
+        self._strip_matcher = re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None
+        self._known_keys = {' '.join(key.split()).casefold(): key.strip() for key in known_keys if key.strip()}
+        self._max_key_words = max((len(key.split()) for key in self._known_keys), default=0)
+        self._canonical: dict[str, str] = {}
+
+    @classmethod
+    def from_files(cls, rules_path: str | None = None, index_path: str | None = None) -> "DescriptionNormalizer":
+        rules = None
+        if rules_path:
+            with open(rules_path, 'r', encoding='utf-8') as f:
+                rules = NormalizationRules.model_validate_json(f.read())
+        known_keys = []
+        if index_path:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                known_keys = json.load(f)
+        return cls(rules, known_keys)
+
+    def canonicalize(self, description: str) -> str:
+        canonical = self._canonical.get(description)
+        if canonical is None:
+            canonical = self._canonical[description] = self._clean(description)
+        return canonical
+
+    def _clean(self, description: str) -> str:
+        cleaned = self._strip_matcher.sub(' ', description) if self._strip_matcher else description
+        cleaned = ' '.join(cleaned.split()).strip(' -,.*#/:;')
+        if not cleaned:
+            return description.strip()
+
+        words = cleaned.casefold().split()
+        for length in range(min(self._max_key_words, len(words)), 0, -1):
+            known = self._known_keys.get(' '.join(words[:length]))
+            if known:
+                return known
+        return cleaned
+
+
+@contextmanager
+def _open_csv(filepath: str, byte_range: tuple[int, int] | None = None):
+    """Open a whole CSV file, or just the rows in a byte range cut by split_csv_ranges."""
+    if byte_range is None:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            yield f
+        return
+
+    start, end = byte_range
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        text = mapped[start:end].decode('utf-8')
+    yield io.StringIO(text, newline='')
+
+
+def _quote_count(mapped: mmap.mmap, start: int, end: int) -> int:
+    return sum(
+        mapped[block:min(block + QUOTE_SCAN_BLOCK_BYTES, end)].count(b'"')
+        for block in range(start, end, QUOTE_SCAN_BLOCK_BYTES)
+    )
+
+
+def split_csv_ranges(filepath: str, chunk_bytes: int) -> tuple[list[str], list[tuple[int, int]]]:
+    """
+    Cut a CSV file into byte ranges of roughly chunk_bytes that each hold whole rows.
+
+    The file is memory-mapped and only scanned, never loaded. A newline ends a
+    row only if an even number of quote characters precede it (escaped quotes
+    come in pairs), so cuts are moved forward to the first such newline after
+    each target offset. Returns the header columns and the data row ranges.
+    """
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        size = len(mapped)
+
+        def next_row_start(position: int, quotes: int) -> tuple[int, int]:
+            while True:
+                newline = mapped.find(b'\n', position)
+                if newline < 0:
+                    return size, quotes
+                quotes += _quote_count(mapped, position, newline)
+                position = newline + 1
+                if quotes % 2 == 0:
+                    return position, quotes
+
+        data_start, quotes = next_row_start(0, 0)
+        header = next(csv_reader(io.StringIO(mapped[:data_start].decode('utf-8'), newline='')), [])
+
+        ranges = []
+        start = data_start
+        while start < size:
+            target = min(start + chunk_bytes, size)
+            quotes += _quote_count(mapped, start, target)
+            end, quotes = next_row_start(target, quotes) if target < size else (size, quotes)
+            ranges.append((start, end))
+            start = end
+
+    return header, ranges
+
+
+class DateRangeIndex:
+    """
+    Sidecar index mapping Started Date ranges of a CSV export to byte offsets.
+
+    The file is cut into row-aligned blocks of about DATE_INDEX_BLOCK_BYTES by
+    split_csv_ranges() and each block records the earliest and latest started
+    date of its rows, so the export does not have to be sorted; chronological
+    exports just skip the most. Saved next to the input as <input>.idx.json and
+    rebuilt when the input's size or modification time changes.
+    """
+
+    VERSION = 1
+
+    def __init__(self, size: int, mtime_ns: int, header: list[str], blocks: list[tuple[int, int, str, str]]):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.header = header
+        self.blocks = blocks
+
+    @staticmethod
+    def _signature(path: str) -> tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    @classmethod
+    def build(cls, path: str, block_bytes: int = DATE_INDEX_BLOCK_BYTES) -> "DateRangeIndex":
+        size, mtime_ns = cls._signature(path)
+        header, ranges = split_csv_ranges(path, block_bytes)
+        if 'Started Date' not in header:
+            raise ValueError(f"{path} has no 'Started Date' column to index")
+        column = header.index('Started Date')
+        blocks = []
+        for start, end in ranges:
+            with _open_csv(path, (start, end)) as f:
+                days = [row[column][:10] if len(row) > column else '' for row in csv_reader(f)]
+            if days:
+                blocks.append((start, end, min(days), max(days)))
+        return cls(size, mtime_ns, header, blocks)
+
+    @classmethod
+    def load(cls, path: str) -> "DateRangeIndex":
+        """Read the sidecar index of path, building and saving it first if it is missing or stale."""
+        index_path = f"{path}{DATE_INDEX_SUFFIX}"
+        size, mtime_ns = cls._signature(path)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data['version'] == cls.VERSION and data['size'] == size and data['mtime_ns'] == mtime_ns:
+                return cls(size, mtime_ns, data['header'], [tuple(block) for block in data['blocks']])
+            logger.info(f"🗂️  Date index {index_path} is out of date, rebuilding")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"⚠️  Ignoring unreadable date index {index_path}: {e}")
+
+        start_time = time.perf_counter()
+        index = cls.build(path)
+        logger.info(f"🗂️  Indexed {len(index.blocks)} blocks of {path} in {time.perf_counter() - start_time:.2f}s")
+        try:
+            index.save(index_path)
+        except OSError as e:
+            logger.warning(f"⚠️  Could not save date index {index_path}: {e}")
+        return index
+
+    def save(self, index_path: str):
+        data = {
+            'version': self.VERSION,
+            'size': self.size,
+            'mtime_ns': self.mtime_ns,
+            'header': self.header,
+            'blocks': self.blocks,
+        }
+        temporary_path = f"{index_path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temporary_path, index_path)
+
+    def ranges(self, since: str | None, until: str | None, max_bytes: int | None = None) -> list[tuple[int, int]]:
+        """Byte ranges covering every block that may hold rows started within since..until, adjacent blocks joined up to max_bytes."""
+        ranges = []
+        for start, end, first_day, last_day in self.blocks:
+            if (since and last_day < since) or (until and first_day > until):
+                continue
+            if ranges and ranges[-1][1] == start and (max_bytes is None or end - ranges[-1][0] <= max_bytes):
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+
+def read_transactions_from_csv(filepath: str, byte_range: tuple[int, int] | None = None,
+                               header: list[str] | None = None) -> Iterator[TransactionRow]:
+    """
+    Lazily yield validated transactions so rows never pile up in memory.
+
+    With a byte range from split_csv_ranges only the rows inside it are read,
+    using the header columns passed in.
+    """
+    count = 0
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        reader = DictReader(f)
+    with _open_csv(filepath, byte_range) as f:
+        reader = DictReader(f, fieldnames=header)
         for row in reader:
-            transaction = TransactionRow(
+            yield TransactionRow(
                 type=row.get('Type', ''),
                 product=row.get('Product', ''),
                 started_date=row.get('Started Date', ''),
@@ -174,108 +714,1224 @@ def read_transactions_from_csv(filepath: str) -> list[TransactionRow]:
                 balance=row.get('Balance', 0.0),
                 occurrences=1
             )
-            transactions.append(transaction)
+            count += 1
+
+    logger.debug(f"Loaded {count} transactions from {filepath}")
+
+
+def _parse_float_column(values: Sequence[str], column: str, offset: int, errors: list[tuple[int, str]]) -> array:
+    """Convert a text column to floats in one pass, treating empty cells as zero."""
+    try:
+        return array('d', [float(value) if value else 0.0 for value in values])
+    except ValueError:
+        pass
+
+    parsed = array('d', bytes(8 * len(values)))
+    for index, value in enumerate(values):
+        try:
+            parsed[index] = float(value) if value else 0.0
+        except ValueError:
+            errors.append((offset + index, f"{column} is not a number: {value!r}"))
+    return parsed
+
+
+def _validate_columns(columns: dict[str, Sequence[str]], offset: int) -> list:
+    """Validate a batch of columns at once and return typed columns in TransactionRecord order."""
+    errors = []
+    amounts = _parse_float_column(columns['amount'], 'Amount', offset, errors)
+    fees = _parse_float_column(columns['fee'], 'Fee', offset, errors)
+    balances = _parse_float_column(columns['balance'], 'Balance', offset, errors)
+
+    errors.extend(
+        (offset + index, f"Fee must be non-negative, got {fee}")
+        for index, fee in enumerate(fees) if not fee >= 0
+    )
+    errors.extend(
+        (offset + index, f"Currency must be a 3-letter code, got {currency!r}")
+        for index, currency in enumerate(columns['currency']) if len(currency) != 3
+    )
+
+    if errors:
+        details = "\n".join(f"  row {index}: {message}" for index, message in sorted(errors)[:MAX_REPORTED_ERRORS])
+        raise ValueError(f"{len(errors)} invalid value(s) in CSV batch starting at row {offset}:\n{details}")
+
+    return [
+        columns['type'], columns['product'], columns['started_date'], columns['completed_date'],
+        columns['description'], amounts, fees, columns['currency'], columns['state'], balances,
+    ]
+
+
+def read_transactions_columnar(filepath: str, byte_range: tuple[int, int] | None = None, header: list[str] | None = None,
+                               batch_size: int = COLUMNAR_BATCH_SIZE) -> Iterator[TransactionRecord]:
+    """
+    Columnar alternative to read_transactions_from_csv.
 
-    logger.debug(f"Loaded {len(transactions)} transactions from {filepath}")
-    return transactions
+    Rows are read in batches, transposed into columns and validated column by column
+    instead of instantiating a pydantic model per row. Errors are reported by 0-based
+    data row index, counted from the start of the byte range if one is given. Only
+    one batch is held in memory at a time.
+    """
+    count = 0
+
+    with _open_csv(filepath, byte_range) as f:
+        reader = csv_reader(f)
+        if header is None:
+            header = next(reader, [])
+        positions = {field: header.index(name) if name in header else None for field, name in CSV_COLUMNS.items()}
+
+        while raw_batch := list(islice(reader, batch_size)):
+            # Blank lines come back as [] and are skipped, like DictReader does
+            batch = [row for row in raw_batch if row]
+            if not batch:
+                continue
+            if min(map(len, batch)) < len(header):
+                batch = [row + [''] * (len(header) - len(row)) for row in batch]
+            transposed = list(zip(*batch))
+            missing = ('',) * len(batch)
+            columns = {
+                field: transposed[position] if position is not None else missing
+                for field, position in positions.items()
+            }
+            typed_columns = _validate_columns(columns, offset=count)
+            yield from map(TransactionRecord._make, zip(*typed_columns, [1] * len(batch)))
+            count += len(batch)
 
+    logger.debug(f"Loaded {count} transactions from {filepath} (columnar)")
 
-def filter_external_transactions(transactions: list[TransactionRow]) -> list[TransactionRow]:
-    """Filter out internal transfers and keep only external transactions."""
-    external_transactions = []
+
+def _archive_format(path: str) -> str | None:
+    """'parquet' or 'arrow' for columnar archive paths by extension, None for CSV."""
+    return ARCHIVE_FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ValueError("Parquet and Arrow files need pyarrow, install it with `uv sync --extra arrow`") from None
+    return pyarrow
+
+
+def _archive_schema(pa):
+    dates = {'started_date', 'completed_date'}
+    floats = {'amount', 'fee', 'balance'}
+    return pa.schema([
+        (name, pa.timestamp('s') if field in dates else pa.float64() if field in floats else pa.string())
+        for field, name in CSV_COLUMNS.items()
+    ])
+
+
+def write_transaction_archive(input_paths: list[str], archive_path: str) -> int:
+    """
+    Convert bank CSV exports into one typed columnar archive and return the row count.
+
+    Rows are validated by the columnar reader and written batch by batch as
+    Parquet, or Arrow IPC for .arrow/.feather paths, with the CSV column names,
+    dates as second-precision timestamps and amounts as float64. Each batch
+    becomes a Parquet row group, whose date statistics let ranged reads skip it.
+    """
+    pa = _import_pyarrow()
+    import pyarrow.compute as pc
+
+    schema = _archive_schema(pa)
+    if _archive_format(archive_path) == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(archive_path, schema)
+    else:
+        writer = pa.ipc.new_file(archive_path, schema)
+
+    count = 0
+    with writer:
+        for path in input_paths:
+            records = read_transactions_columnar(path)
+            while batch := list(islice(records, COLUMNAR_BATCH_SIZE)):
+                arrays = []
+                for field, column in zip(schema, zip(*batch)):
+                    if pa.types.is_timestamp(field.type):
+                        strings = pa.array([value or None for value in column], pa.string())
+                        arrays.append(pc.strptime(strings, format=ARCHIVE_DATE_FORMAT, unit='s'))
+                    else:
+                        arrays.append(pa.array(column, field.type))
+                writer.write_batch(pa.record_batch(arrays, schema=schema))
+                count += len(batch)
+            logger.debug(f"Archived {path}")
+    return count
+
+
+def read_transactions_archive(filepath: str, since: str | None = None, until: str | None = None) -> Iterator[TransactionRecord]:
+    """
+    Yield transactions from an archive written by write_transaction_archive().
+
+    The file is memory-mapped, so Arrow IPC batches are used without copying
+    and Parquet pages are decoded straight from the mapping. The archive is
+    already typed, so rows need no validation; each batch's columns are turned
+    into Python values at once. With since/until, Parquet row groups whose
+    Started Date statistics lie outside the range are not read at all.
+    """
+    pa = _import_pyarrow()
+    import pyarrow.compute as pc
+
+    count = 0
+    with pa.memory_map(filepath, 'r') as source:
+        if _archive_format(filepath) == 'parquet':
+            import pyarrow.parquet as pq
+            parquet_file = pq.ParquetFile(source)
+            row_groups = list(range(parquet_file.num_row_groups))
+            if since or until:
+                column = parquet_file.schema_arrow.get_field_index(CSV_COLUMNS['started_date'])
+                row_groups = [
+                    group for group in row_groups
+                    if not (statistics := parquet_file.metadata.row_group(group).column(column).statistics)
+                    or not statistics.has_min_max
+                    or ((not since or statistics.max.date().isoformat() >= since)
+                        and (not until or statistics.min.date().isoformat() <= until))
+                ]
+            batches = parquet_file.iter_batches(batch_size=COLUMNAR_BATCH_SIZE, row_groups=row_groups)
+        else:
+            reader = pa.ipc.open_file(source)
+            batches = (reader.get_batch(index) for index in range(reader.num_record_batches))
+
+        for batch in batches:
+            columns = []
+            for name in CSV_COLUMNS.values():
+                column = batch.column(name)
+                if pa.types.is_timestamp(column.type):
+                    # Parquet stores seconds as milliseconds; second-precision timestamps cast back to
+                    # the export's "YYYY-MM-DD HH:MM:SS" text
+                    column = pc.fill_null(column.cast(pa.timestamp('s')).cast(pa.string()), "")
+                columns.append(column.to_pylist())
+            yield from map(TransactionRecord._make, zip(*columns, [1] * batch.num_rows))
+            count += batch.num_rows
+
+    logger.debug(f"Loaded {count} transactions from {filepath} (archive)")
+
+
+def filter_date_range(transactions: Iterable[Transaction], since: str | None = None,
+                      until: str | None = None) -> Iterator[Transaction]:
+    """Keep transactions whose started date falls within since..until (inclusive YYYY-MM-DD, either end may be open)."""
+    since = since or ''
+    until = until or '9999-12-31'
+    for transaction in transactions:
+        if since <= transaction.started_date[:10] <= until:
+            yield transaction
+
+
+def filter_external_transactions(transactions: Iterable[Transaction], classifier: TransferClassifier | None = None,
+                                 stats: Counter | None = None) -> Iterator[Transaction]:
+    """Filter out internal transfers and keep only external transactions, adding the counts to stats if given."""
+    classifier = classifier or DEFAULT_TRANSFER_CLASSIFIER
+    external_count = 0
     internal_count = 0
     
     for transaction in transactions:
         if transaction.state != "COMPLETED":
             continue
             
-        if is_internal_transfer(transaction):
+        if classifier.is_internal(transaction):
             internal_count += 1
             logger.debug(f"Filtered internal transfer: {transaction.description} ({transaction.currency} {transaction.amount})")
         else:
-            external_transactions.append(transaction)
+            external_count += 1
+            yield transaction
     
-    logger.info(f"Filtered {internal_count} internal transfers, kept {len(external_transactions)} external transactions")
-    return external_transactions
+    if stats is not None:
+        stats['internal'] += internal_count
+        stats['external'] += external_count
+    logger.info(f"Filtered {internal_count} internal transfers, kept {external_count} external transactions")
+
+
+class GroupSpill:
+    """
+    Temporary on-disk aggregate that full in-memory GroupStores are flushed into.
+
+    Backs bounded-memory grouping: whenever the resident store (and its period
+    cube) reaches the group budget it is upserted into a private temporary
+    SQLite database keyed by group key and emptied. Each group keeps the row
+    number where it was first seen and each original description the flush and
+    position where it first appeared. finish() numbers the merged groups in the
+    order in-memory grouping produces; the later stages then read them back
+    with batches() a bounded number at a time instead of loading them all, and
+    rollup() builds period breakdowns from the spilled cube inside SQLite.
+    """
+
+    RESULT = "result"
+    COLUMNS = "id, key, description, occurrences, category, comment"
+
+    def __init__(self, batch_groups: int):
+        # An empty filename gives a private on-disk database that is deleted on close;
+        # stages read it from worker threads, one at a time under the lock
+        self.connection = sqlite3.connect('', check_same_thread=False)
+        self.connection.create_function("period_label", 2, _period_label, deterministic=True)
+        for prefix in ("", "cell_"):
+            self.connection.executescript(f"""
+                CREATE TABLE {prefix}groups (key TEXT PRIMARY KEY, first_seen INTEGER NOT NULL, description TEXT NOT NULL,
+                                             occurrences INTEGER NOT NULL);
+                CREATE TABLE {prefix}amounts (key TEXT NOT NULL, currency TEXT NOT NULL, amount INTEGER NOT NULL,
+                                              PRIMARY KEY (key, currency));
+                CREATE TABLE {prefix}converted (key TEXT NOT NULL, currency TEXT NOT NULL, amount INTEGER NOT NULL,
+                                                PRIMARY KEY (key, currency));
+            """)
+        self.connection.execute("CREATE TABLE originals (key TEXT NOT NULL, original TEXT NOT NULL, flush INTEGER NOT NULL, "
+                                "position INTEGER NOT NULL, PRIMARY KEY (key, original))")
+        self.lock = threading.Lock()
+        self.batch_groups = batch_groups
+        self.flushes = 0
+        self.groups = 0
+        self.target_currencies: list[str] = []
+        self.track_originals = False
+        self.track_periods = False
 
+    def __len__(self) -> int:
+        return self.groups
 
-def group_transactions_by_description(transactions: list[TransactionRow]) -> list[GroupedTransaction]:
-    grouped = defaultdict(list)
+    def _upsert(self, prefix: str, store: GroupStore, first_seen: Iterable[int]):
+        keys = list(store.keys)
+        self.connection.executemany(
+            f"INSERT INTO {prefix}groups VALUES (?, ?, ?, ?) "
+            f"ON CONFLICT (key) DO UPDATE SET occurrences = occurrences + excluded.occurrences",
+            zip(keys, first_seen, store.descriptions, store.occurrences)
+        )
+        for table, currencies, columns in (('amounts', store.currencies, store.amounts),
+                                           ('converted', store.target_currencies, store.converted)):
+            for currency, column in zip(currencies, columns):
+                self.connection.executemany(
+                    f"INSERT INTO {prefix}{table} VALUES (?, ?, ?) "
+                    f"ON CONFLICT (key, currency) DO UPDATE SET amount = amount + excluded.amount",
+                    ((key, currency, amount) for key, amount in zip(keys, column) if amount or table == 'converted')
+                )
+
+    def flush(self, store: GroupStore, first_seen: array):
+        """Upsert a full store and its period cube; the caller continues with empty ones."""
+        with self.connection:
+            self._upsert("", store, first_seen)
+            if store.originals is not None:
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO originals VALUES (?, ?, ?, ?)",
+                    ((key, original, self.flushes, position)
+                     for key, originals in zip(store.keys, store.originals) for position, original in enumerate(originals))
+                )
+            if store.periods is not None:
+                self._upsert("cell_", store.periods, repeat(0))
+        self.target_currencies = store.target_currencies
+        self.track_originals = store.originals is not None
+        self.track_periods = store.periods is not None
+        self.flushes += 1
+
+    def finish(self):
+        """Number the merged groups in first-seen order as the result table that batches() reads."""
+        with self.connection:
+            self.connection.executescript(f"""
+                CREATE TABLE {self.RESULT} (id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, description TEXT NOT NULL,
+                                            occurrences INTEGER NOT NULL, category TEXT NOT NULL DEFAULT '',
+                                            comment TEXT NOT NULL DEFAULT '');
+                INSERT INTO {self.RESULT} (key, description, occurrences)
+                    SELECT key, description, occurrences FROM groups ORDER BY first_seen;
+                CREATE TABLE {self.RESULT}_amounts (id INTEGER NOT NULL, currency TEXT NOT NULL, amount INTEGER NOT NULL,
+                                                    PRIMARY KEY (id, currency));
+                INSERT INTO {self.RESULT}_amounts SELECT r.id, a.currency, a.amount FROM amounts a JOIN {self.RESULT} r USING (key);
+                CREATE TABLE {self.RESULT}_converted (id INTEGER NOT NULL, currency TEXT NOT NULL, amount INTEGER NOT NULL,
+                                                      PRIMARY KEY (id, currency));
+                INSERT INTO {self.RESULT}_converted SELECT r.id, c.currency, c.amount FROM converted c JOIN {self.RESULT} r USING (key);
+                CREATE TABLE {self.RESULT}_originals (id INTEGER NOT NULL, flush INTEGER NOT NULL, position INTEGER NOT NULL,
+                                                      original TEXT NOT NULL, PRIMARY KEY (id, flush, position));
+                INSERT INTO {self.RESULT}_originals SELECT r.id, o.flush, o.position, o.original FROM originals o JOIN {self.RESULT} r USING (key);
+                DROP TABLE groups;
+                DROP TABLE amounts;
+                DROP TABLE converted;
+                DROP TABLE originals;
+            """)
+        self.groups = self.connection.execute(f"SELECT count(*) FROM {self.RESULT}").fetchone()[0]
+
+    def batches(self, table: str = RESULT) -> Iterator[GroupStore]:
+        """Yield the rows of the result (or a rollup() table) in order as GroupStores of at most batch_groups groups."""
+        with self.lock:
+            total = self.connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        for first in range(1, total + 1, self.batch_groups):
+            last = first + self.batch_groups - 1
+            store = GroupStore(self.target_currencies, track_originals=self.track_originals and table == self.RESULT)
+            with self.lock:
+                for _, key, description, occurrences, category, comment in self.connection.execute(
+                        f"SELECT {self.COLUMNS} FROM {table} WHERE id BETWEEN ? AND ? ORDER BY id", (first, last)):
+                    index = store.group_index(key, description)
+                    store.occurrences[index] = occurrences
+                    store.categories[index] = category
+                    store.comments[index] = comment
+                for group_id, currency, amount in self.connection.execute(
+                        f"SELECT id, currency, amount FROM {table}_amounts WHERE id BETWEEN ? AND ?", (first, last)):
+                    store.amounts[store.currency_code(currency)][group_id - first] = amount
+                targets = dict(zip(store.target_currencies, store.converted))
+                for group_id, currency, amount in self.connection.execute(
+                        f"SELECT id, currency, amount FROM {table}_converted WHERE id BETWEEN ? AND ?", (first, last)):
+                    targets[currency][group_id - first] = amount
+                if store.originals is not None:
+                    for group_id, original in self.connection.execute(
+                            f"SELECT id, original FROM {table}_originals WHERE id BETWEEN ? AND ? ORDER BY id, flush, position",
+                            (first, last)):
+                        store.originals[group_id - first][original] = None
+            yield store
+
+    def store_categories(self, store: GroupStore):
+        """Write back the categories and comments of a batch from batches()."""
+        with self.lock, self.connection:
+            self.connection.executemany(f"UPDATE {self.RESULT} SET category = ?, comment = ? WHERE key = ?",
+                                        zip(store.categories, store.comments, store.keys))
+
+    def category_counts(self) -> dict[str, int]:
+        with self.lock:
+            return dict(self.connection.execute(f"SELECT category, count(*) FROM {self.RESULT} GROUP BY category"))
+
+    def rollup(self, period: Period) -> str:
+        """
+        Roll the spilled day-level cube up to one row per period and group, like rollup_periods().
+
+        Returns the name of the table to pass to batches(); its rows are ordered by
+        period, then by the group's first appearance, and carry the parent's
+        description, category and comment.
+        """
+        table = f"rollup_{period.value}"
+        with self.lock, self.connection:
+            self.connection.executescript(f"""
+                DROP TABLE IF EXISTS {table};
+                DROP TABLE IF EXISTS {table}_amounts;
+                DROP TABLE IF EXISTS {table}_converted;
+                CREATE TEMP TABLE cells AS
+                    SELECT c.key AS cell, period_label(substr(c.key, 1, instr(c.key, char(31)) - 1), '{period.value}') AS label,
+                           r.id AS parent, c.occurrences AS occurrences
+                    FROM cell_groups c JOIN {self.RESULT} r ON r.key = substr(c.key, instr(c.key, char(31)) + 1);
+                CREATE TABLE {table} (id INTEGER PRIMARY KEY, key TEXT NOT NULL, description TEXT NOT NULL,
+                                      occurrences INTEGER NOT NULL, category TEXT NOT NULL, comment TEXT NOT NULL,
+                                      label TEXT NOT NULL, parent INTEGER NOT NULL, UNIQUE (label, parent));
+                INSERT INTO {table} (key, description, occurrences, category, comment, label, parent)
+                    SELECT cells.label || char(31) || r.key, r.description, sum(cells.occurrences), r.category, r.comment,
+                           cells.label, cells.parent
+                    FROM cells JOIN {self.RESULT} r ON r.id = cells.parent
+                    GROUP BY cells.label, cells.parent ORDER BY cells.label, cells.parent;
+                CREATE TABLE {table}_amounts (id INTEGER NOT NULL, currency TEXT NOT NULL, amount INTEGER NOT NULL,
+                                              PRIMARY KEY (id, currency));
+                INSERT INTO {table}_amounts
+                    SELECT t.id, a.currency, sum(a.amount)
+                    FROM cells JOIN {table} t ON t.label = cells.label AND t.parent = cells.parent
+                    JOIN cell_amounts a ON a.key = cells.cell
+                    GROUP BY t.id, a.currency;
+                CREATE TABLE {table}_converted (id INTEGER NOT NULL, currency TEXT NOT NULL, amount INTEGER NOT NULL,
+                                                PRIMARY KEY (id, currency));
+                INSERT INTO {table}_converted
+                    SELECT t.id, c.currency, sum(c.amount)
+                    FROM cells JOIN {table} t ON t.label = cells.label AND t.parent = cells.parent
+                    JOIN cell_converted c ON c.key = cells.cell
+                    GROUP BY t.id, c.currency;
+                DROP TABLE cells;
+            """)
+        return table
+
+    def close(self):
+        self.connection.close()
+
+
+def group_transactions_by_description(transactions: Iterable[Transaction], normalizer: DescriptionNormalizer | None = None,
+                                      rate_store: "RateStore | None" = None, target_currencies: list[str] = (),
+                                      store: GroupStore | None = None, max_groups: int | None = None,
+                                      track_periods: bool = False) -> "GroupStore | GroupSpill":
+    """
+    Fold a transaction stream into running per-description aggregates.
+
+    With a normalizer, transactions are grouped by canonical merchant name
+    (compared case-insensitively) and the distinct raw descriptions of each
+    group are kept for export. With a rate store, every transaction is also
+    converted to the target currencies at its own completion date and the
+    converted totals are accumulated alongside the original amounts. Passing
+    an existing store continues aggregating into it.
+
+    With max_groups, at most that many groups and period cube cells are
+    aggregated in memory; a full store is flushed to a GroupSpill on disk and,
+    if any flush happened, the finished GroupSpill is returned in place of a
+    store so the result is never loaded whole. max_groups cannot continue an
+    existing store.
+
+    With track_periods, every transaction is also added to the store's day-level
+    period cube under its started date, in the same pass.
+    """
+    def new_store() -> GroupStore:
+        return GroupStore(target_currencies if rate_store else (), track_originals=normalizer is not None,
+                          track_periods=track_periods)
+
+    if max_groups and store is not None:
+        raise ValueError("Spilling groups to disk cannot continue an existing store")
+    if store is None:
+        store = new_store()
+    add = store.add
+    transaction_count = 0
+    spill = GroupSpill(max_groups) if max_groups else None
+    first_seen = array('q')
+    periods = store.periods
 
     for transaction in transactions:
-        grouped[transaction.description].append(transaction)
-
-    result = []
-    for description, group in grouped.items():
-        amounts_by_currency = defaultdict(float)
-        for transaction in group:
-            amounts_by_currency[transaction.currency] += transaction.amount
-
-        grouped_transaction = GroupedTransaction(
-            description=description,
-            amounts=dict(amounts_by_currency),
-            occurrences=len(group),
-            category="",
-            comment=""
+        description = transaction.description
+        if normalizer:
+            canonical = normalizer.canonicalize(description)
+            key = canonical.casefold()
+            index = add(key, canonical, transaction.currency, transaction.amount, description)
+        else:
+            key = canonical = description
+            index = add(description, description, transaction.currency, transaction.amount)
+        transaction_count += 1
+
+        if periods is not None:
+            cell = periods.add(f"{transaction.started_date[:10]}{PERIOD_KEY_SEPARATOR}{key}", canonical,
+                               transaction.currency, transaction.amount)
+
+        if rate_store:
+            day = rate_store.day_index(transaction.completed_date or transaction.started_date)
+            amount_usd = rate_store.to_usd(transaction.amount, transaction.currency, day)
+            if periods is None:
+                for target_currency, column in zip(store.target_currencies, store.converted):
+                    column[index] += round(rate_store.from_usd(amount_usd, target_currency, day) * AMOUNT_SCALE)
+            else:
+                for target_currency, column, cell_column in zip(store.target_currencies, store.converted, periods.converted):
+                    converted = round(rate_store.from_usd(amount_usd, target_currency, day) * AMOUNT_SCALE)
+                    column[index] += converted
+                    cell_column[cell] += converted
+
+        if spill is not None:
+            if store.occurrences[index] == 1:
+                first_seen.append(transaction_count)
+            if len(store) + (len(periods) if periods is not None else 0) >= max_groups:
+                spill.flush(store, first_seen)
+                store, first_seen = new_store(), array('q')
+                periods, add = store.periods, store.add
+
+    if spill is not None:
+        if not spill.flushes:
+            spill.close()
+        else:
+            spill.flush(store, first_seen)
+            spill.finish()
+            logger.info(f"💽 Spilled groups to disk {spill.flushes} time(s) to stay within {max_groups:,} resident groups")
+            logger.debug(f"Grouped {transaction_count} transactions into {len(spill)} unique groups")
+            return spill
+
+    logger.debug(f"Grouped {transaction_count} transactions into {len(store)} unique groups")
+    return store
+
+
+class IngestOptions(NamedTuple):
+    """Settings that turn CSV files into group aggregates, shipped once to every ingest worker process."""
+    mode: str = IngestMode.PYDANTIC.value
+    transfer_rules: str | None = None
+    normalize_descriptions: bool = False
+    normalization_rules: str | None = None
+    merchant_index: str | None = None
+    rate_store: "RateStore | None" = None
+    target_currencies: tuple[str, ...] = ()
+    track_periods: bool = False
+    since: str | None = None
+    until: str | None = None
+
+    def read(self, path: str, byte_range: tuple[int, int] | None = None, header: list[str] | None = None) -> Iterator[Transaction]:
+        if _archive_format(path):
+            transactions = read_transactions_archive(path, self.since, self.until)
+        elif self.mode == IngestMode.COLUMNAR:
+            transactions = read_transactions_columnar(path, byte_range, header)
+        else:
+            transactions = read_transactions_from_csv(path, byte_range, header)
+        if self.since or self.until:
+            transactions = filter_date_range(transactions, self.since, self.until)
+        return transactions
+
+    def classifier(self) -> TransferClassifier:
+        return TransferClassifier.from_file(self.transfer_rules) if self.transfer_rules else DEFAULT_TRANSFER_CLASSIFIER
+
+    def normalizer(self) -> DescriptionNormalizer | None:
+        if not self.normalize_descriptions:
+            return None
+        return DescriptionNormalizer.from_files(self.normalization_rules, self.merchant_index)
+
+
+class IngestTask(NamedTuple):
+    """A whole input file, or one byte range of a large file together with its header columns."""
+    path: str
+    byte_range: tuple[int, int] | None = None
+    header: list[str] | None = None
+
+
+def plan_ingest_tasks(paths: list[str], chunk_bytes: int, split: bool = True,
+                      date_range: tuple[str | None, str | None] | None = None) -> list[IngestTask]:
+    """
+    One task per file, with files larger than chunk_bytes split into row-aligned byte ranges when split is set.
+
+    With a date range, each file's DateRangeIndex is consulted instead and only
+    the byte ranges that may hold rows started in that range are read, in
+    ranges of at most chunk_bytes. Columnar archives are always read whole.
+    """
+    tasks = []
+    for path in paths:
+        if _archive_format(path):
+            tasks.append(IngestTask(path))
+            continue
+        if date_range:
+            index = DateRangeIndex.load(path)
+            ranges = index.ranges(*date_range, chunk_bytes)
+            selected = sum(end - start for start, end in ranges)
+            logger.info(f"🗂️  Reading {selected / 1024 / 1024:.1f} of {index.size / 1024 / 1024:.1f} MB of {path} "
+                        f"for {date_range[0] or '…'} – {date_range[1] or '…'}")
+            tasks.extend(IngestTask(path, byte_range, index.header) for byte_range in ranges)
+            continue
+        if not split or os.path.getsize(path) <= chunk_bytes:
+            tasks.append(IngestTask(path))
+            continue
+        header, ranges = split_csv_ranges(path, chunk_bytes)
+        tasks.extend(IngestTask(path, byte_range, header) for byte_range in ranges)
+    return tasks
+
+
+class PartialAggregate(NamedTuple):
+    """Group aggregates of one ingest task plus the counters the parent reports."""
+    store: GroupStore
+    internal: int
+    external: int
+    clamped_lookups: int
+
+
+_worker_state: tuple[IngestOptions, TransferClassifier, DescriptionNormalizer | None] | None = None
+
+
+def _init_ingest_worker(options: IngestOptions):
+    global _worker_state
+    logging.getLogger().setLevel(logging.WARNING)
+    _worker_state = (options, options.classifier(), options.normalizer())
+
+
+def _aggregate_task(task: IngestTask) -> PartialAggregate:
+    options, classifier, normalizer = _worker_state
+    stats = Counter()
+    rate_store = options.rate_store
+    if rate_store:
+        rate_store.clamped_lookups = 0
+    store = group_transactions_by_description(
+        filter_external_transactions(options.read(*task), classifier, stats),
+        normalizer, rate_store, list(options.target_currencies), track_periods=options.track_periods
+    )
+    return PartialAggregate(store, stats['internal'], stats['external'], rate_store.clamped_lookups if rate_store else 0)
+
+
+def aggregate_in_parallel(tasks: list[IngestTask], options: IngestOptions, workers: int) -> tuple[GroupStore, int]:
+    """
+    Read, filter and group each file or byte range in a worker process and merge the partial aggregates.
+
+    Workers are spawned rather than forked because ingestion runs off the event
+    loop thread. Each worker maps only its own range of a large file, so the
+    parent never holds the rows. Partial stores are merged in task order, so
+    groups keep the order in which they first appear in the input. Returns the
+    merged store and the number of rate lookups clamped to the rate history.
+    """
+    context = multiprocessing.get_context("spawn")
+    store = None
+    internal = external = clamped_lookups = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_ingest_worker, initargs=(options,)) as executor:
+        for task, partial in zip(tasks, executor.map(_aggregate_task, tasks)):
+            location = f"{task.path} bytes {task.byte_range[0]}-{task.byte_range[1]}" if task.byte_range else task.path
+            logger.debug(f"Aggregated {location}: {len(partial.store)} groups from {partial.external} external transactions")
+            if store is None:
+                store = partial.store
+            else:
+                store.merge(partial.store)
+            internal += partial.internal
+            external += partial.external
+            clamped_lookups += partial.clamped_lookups
+
+    logger.info(f"Filtered {internal} internal transfers, kept {external} external transactions")
+    return store, clamped_lookups
+
+
+def _file_digest(path: str | None) -> str | None:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class RunManifest:
+    """
+    Record of already processed rows and the group aggregates they produced, for --incremental runs.
+
+    Rows are identified by a content hash of all their fields and counted, so a
+    row that genuinely repeats in the export is still processed once per copy.
+    The manifest also keeps the settings that shape the aggregates; if they
+    change, the manifest is ignored and everything is processed again.
+    """
+
+    VERSION = 3
+
+    def __init__(self, settings: dict, fingerprints: Counter | None = None, store: GroupStore | None = None):
+        self.settings = settings
+        self.fingerprints = fingerprints or Counter()
+        self.store = store
+        self.new_rows = 0
+        self.skipped_rows = 0
+
+    @staticmethod
+    def fingerprint(transaction: Transaction) -> str:
+        fields = (
+            transaction.type, transaction.product, transaction.started_date, transaction.completed_date,
+            transaction.description, transaction.amount, transaction.fee, transaction.currency,
+            transaction.state, transaction.balance,
         )
+        return hashlib.blake2b("\x1f".join(map(str, fields)).encode('utf-8'), digest_size=12).hexdigest()
+
+    @classmethod
+    def load(cls, path: str, settings: dict) -> "RunManifest":
+        if not os.path.exists(path):
+            logger.info(f"📒 No manifest at {path}, processing all transactions")
+            return cls(settings)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != cls.VERSION or data.get('settings') != settings:
+                logger.warning("⚠️  Manifest was written with different settings, processing all transactions")
+                return cls(settings)
+            manifest = cls(settings, Counter(data['fingerprints']), GroupStore.from_state(data['groups']))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"⚠️  Ignoring unreadable manifest {path}: {e}")
+            return cls(settings)
+        logger.info(f"📒 Loaded manifest with {manifest.fingerprints.total()} processed rows and {len(manifest.store)} groups")
+        return manifest
+
+    def skip_processed(self, transactions: Iterable[Transaction]) -> Iterator[Transaction]:
+        """Yield only rows not recorded in the manifest, recording them as they pass."""
+        previous = Counter(self.fingerprints)
+        for transaction in transactions:
+            fingerprint = self.fingerprint(transaction)
+            if previous[fingerprint] > 0:
+                previous[fingerprint] -= 1
+                self.skipped_rows += 1
+                continue
+            self.fingerprints[fingerprint] += 1
+            self.new_rows += 1
+            yield transaction
+
+        logger.info(f"📒 Incremental: {self.new_rows} new rows, {self.skipped_rows} already processed")
+
+    def save(self, path: str, store: GroupStore, uncategorized: Iterable[int] = ()):
+        """Write the manifest, storing the groups at the uncategorized indexes without a category so the next run retries them."""
+        groups = store.to_state()
+        groups['categories'] = list(groups['categories'])
+        for index in uncategorized:
+            groups['categories'][index] = ""
+        data = {
+            'version': self.VERSION,
+            'settings': self.settings,
+            'fingerprints': self.fingerprints,
+            'groups': groups,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temporary_path, path)
+        logger.info(f"📒 Saved manifest with {self.fingerprints.total()} processed rows to {path}")
+
+
+def _format_age(seconds: float) -> str:
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f}h"
+    return f"{seconds / 86400:.1f}d"
+
 
-        result.append(grouped_transaction)
+def _load_cached_rates(cache_path: str | None, base_currency: str) -> tuple[dict[str, float], float] | None:
+    if not cache_path or not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            entry = json.load(f).get(base_currency)
+        return ({currency: float(rate) for currency, rate in entry['rates'].items()}, float(entry['fetched_at'])) if entry else None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"⚠️  Ignoring unreadable exchange rate cache {cache_path}: {e}")
+        return None
+
+
+def _store_cached_rates(cache_path: str, base_currency: str, rates: dict[str, float]):
+    cache = {}
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+    cache[base_currency] = {'fetched_at': time.time(), 'rates': rates}
+
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    temporary_path = f"{cache_path}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f)
+    os.replace(temporary_path, cache_path)
+
+
+async def get_exchange_rates(base_currency: str = "USD", cache_path: str | None = DEFAULT_FX_CACHE,
+                             ttl_hours: float = DEFAULT_FX_TTL_HOURS, offline: bool = False) -> dict[str, float]:
+    """
+    Return exchange rates from ExchangeRate-API, backed by an on-disk cache.
 
-    logger.debug(f"Grouped {len(transactions)} transactions into {len(result)} unique groups")
-    return result
+    Cached rates younger than ttl_hours are used without a network call. In
+    offline mode the last cached table is used regardless of age. If a fetch
+    fails, stale cached rates are used with a warning; with no cache at all a
+    RuntimeError is raised instead of silently converting at 1.0.
+    """
+    cached = _load_cached_rates(cache_path, base_currency)
+    age = time.time() - cached[1] if cached else None
+
+    if offline:
+        if not cached:
+            raise RuntimeError(f"Offline mode requested but no cached {base_currency} exchange rates in {cache_path}")
+        logger.info(f"💱 Offline: using cached exchange rates, {_format_age(age)} old")
+        if age > ttl_hours * 3600:
+            logger.warning(f"⚠️  Cached exchange rates are older than the {ttl_hours:g}h TTL")
+        return cached[0]
 
+    if cached and age <= ttl_hours * 3600:
+        logger.info(f"💱 Using cached exchange rates, {_format_age(age)} old (TTL {ttl_hours:g}h)")
+        return cached[0]
 
-async def get_exchange_rates(base_currency: str = "USD") -> dict[str, float]:
-    """Fetch current exchange rates from ExchangeRate-API."""
     try:
+        import httpx
+
         async with httpx.AsyncClient() as client:
             response = await client.get(f"https://api.exchangerate-api.com/v4/latest/{base_currency}")
             response.raise_for_status()
             data = response.json()
             rates = {currency: float(rate) for currency, rate in data["rates"].items()}
             logger.debug(f"Fetched exchange rates for {len(rates)} currencies")
-            return rates
     except Exception as e:
-        logger.error(f"Failed to fetch exchange rates: {e}")
-        return {}
+        if not cached:
+            raise RuntimeError(f"Failed to fetch exchange rates and no cached rates are available: {e}") from e
+        logger.warning(f"⚠️  Failed to fetch exchange rates ({e}), using stale cached rates {_format_age(age)} old")
+        return cached[0]
 
+    if cache_path:
+        _store_cached_rates(cache_path, base_currency, rates)
+    logger.info("💱 Fetched fresh exchange rates")
+    return rates
 
-async def categorize_transactions(grouped_transactions: list[GroupedTransaction], openai_client: AsyncOpenAI, model: str) -> list[GroupedTransaction]:
-    """Categorize transactions using AI based on their descriptions."""
-    logger.info("🏷️ Categorizing transactions...")
-    initial_count = len(grouped_transactions)
 
-    simplified_transactions = [
-        {"description": t.description, "category": ""} 
-        for t in grouped_transactions
-    ]
-    transactions_json = json.dumps(simplified_transactions, ensure_ascii=False)
+class AhoCorasick:
+    """Minimal Aho-Corasick automaton that finds every keyword occurrence in a single pass."""
+
+    def __init__(self, keywords: dict[str, str]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail = [0]
+        self._outputs: list[list[tuple[int, str]]] = [[]]
+
+        for keyword, value in keywords.items():
+            state = 0
+            for char in keyword:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._outputs[state].append((len(keyword), value))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._outputs[next_state].extend(self._outputs[self._fail[next_state]])
+
+    def find_all(self, text: str) -> Iterator[tuple[int, int, str]]:
+        """Yield (start, end, value) for every keyword occurrence in text."""
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, value in self._outputs[state]:
+                yield position + 1 - length, position + 1, value
+
+
+class MerchantRuleEngine:
+    """
+    Categorize known merchants locally before asking the AI model.
+
+    Rules map a category name to merchant patterns. Plain patterns are matched
+    case-insensitively as whole-word substrings by one Aho-Corasick automaton;
+    the longest match wins, so "Uber Eats" beats "Uber". Patterns prefixed with
+    "re:" are combined into one regex that is consulted when no substring matches.
+    """
+
+    def __init__(self, rules: dict[str, list[str]]):
+        category_names = {name for name, _ in CATEGORIES.values()}
+        keywords = {}
+        regexes = []
+
+        for category, patterns in rules.items():
+            if category not in category_names:
+                raise ValueError(f"Unknown category in merchant rules: {category!r}")
+            for pattern in patterns:
+                if pattern.startswith('re:'):
+                    regexes.append((category, pattern[3:]))
+                elif pattern.strip():
+                    keywords[pattern.strip().casefold()] = category
+
+        self.pattern_count = len(keywords) + len(regexes)
+        self._automaton = AhoCorasick(keywords)
+        self._regex_categories = [category for category, _ in regexes]
+        self._regex = (
+            re.compile('|'.join(f'(?P<r{i}>{pattern})' for i, (_, pattern) in enumerate(regexes)), re.IGNORECASE)
+            if regexes else None
+        )
+
+    @classmethod
+    def from_file(cls, path: str) -> "MerchantRuleEngine":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def match(self, description: str) -> str | None:
+        text = description.casefold()
+        best_length, best_category = 0, None
+
+        for start, end, category in self._automaton.find_all(text):
+            if start > 0 and text[start - 1].isalnum() or end < len(text) and text[end].isalnum():
+                continue
+            if end - start > best_length:
+                best_length, best_category = end - start, category
+
+        if best_category is None and self._regex:
+            found = self._regex.search(description)
+            if found:
+                best_category = self._regex_categories[int(found.lastgroup[1:])]
+
+        return best_category
+
+
+def apply_merchant_rules(grouped_transactions: list[GroupRecord], engine: MerchantRuleEngine) -> list[GroupRecord]:
+    """Categorize groups matched by local merchant rules and return the groups left unresolved."""
+    unresolved = []
+    for transaction in grouped_transactions:
+        category = engine.match(transaction.description)
+        if category:
+            transaction.category = category
+        else:
+            unresolved.append(transaction)
+
+    resolved_count = len(grouped_transactions) - len(unresolved)
+    logger.info(f"🧩 Resolved {resolved_count} of {len(grouped_transactions)} groups with local merchant rules")
+    return unresolved
+
+
+class HistoryClassifier:
+    """
+    Nearest-neighbour categorizer trained on previously accepted categories.
+
+    Descriptions are embedded as L2-normalized TF-IDF vectors of character
+    n-grams and stored in an inverted index (n-gram → [(example, weight)]), so a
+    prediction only touches examples sharing at least one n-gram with the query.
+    The category of the most similar example is returned with its cosine
+    similarity as the confidence.
+    """
+
+    def __init__(self, examples: dict[str, str], ngram_size: int = 3):
+        self.ngram_size = ngram_size
+        self._categories = list(examples.values())
+        document_ngrams = [self._ngrams(description) for description in examples]
+
+        document_frequency = Counter(ngram for ngrams in document_ngrams for ngram in ngrams)
+        self._idf = {
+            ngram: math.log((len(document_ngrams) + 1) / (frequency + 1)) + 1
+            for ngram, frequency in document_frequency.items()
+        }
+
+        self._postings: dict[str, list[tuple[int, float]]] = defaultdict(list)
+        for index, ngrams in enumerate(document_ngrams):
+            for ngram, weight in self._vectorize(ngrams).items():
+                self._postings[ngram].append((index, weight))
+
+    def __len__(self) -> int:
+        return len(self._categories)
+
+    @classmethod
+    def from_files(cls, paths: list[str]) -> "HistoryClassifier":
+        """Train from processed CSV outputs; later files override earlier ones for the same description."""
+        examples = {}
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                for row in DictReader(f):
+                    description, category = row.get('Description', ''), row.get('Category', '')
+                    if description and category:
+                        examples[description] = category
+        return cls(examples)
+
+    def _ngrams(self, text: str) -> Counter:
+        padded = f" {' '.join(text.casefold().split())} "
+        return Counter(padded[i:i + self.ngram_size] for i in range(max(len(padded) - self.ngram_size + 1, 1)))
+
+    def _vectorize(self, ngrams: Counter) -> dict[str, float]:
+        vector = {ngram: count * self._idf[ngram] for ngram, count in ngrams.items() if ngram in self._idf}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {ngram: weight / norm for ngram, weight in vector.items()} if norm else {}
+
+    def predict(self, description: str) -> tuple[str | None, float]:
+        scores = defaultdict(float)
+        for ngram, weight in self._vectorize(self._ngrams(description)).items():
+            for index, document_weight in self._postings[ngram]:
+                scores[index] += weight * document_weight
+
+        if not scores:
+            return None, 0.0
+        best_index = max(scores, key=scores.get)
+        return self._categories[best_index], scores[best_index]
+
+
+def apply_history_classifier(grouped_transactions: list[GroupRecord], classifier: HistoryClassifier,
+                             threshold: float = DEFAULT_HISTORY_THRESHOLD) -> list[GroupRecord]:
+    """Categorize groups predicted with enough confidence from history and return the rest."""
+    unresolved = []
+    for transaction in grouped_transactions:
+        category, confidence = classifier.predict(transaction.description)
+        if category and confidence >= threshold:
+            transaction.category = category
+            logger.debug(f"History match ({confidence:.2f}): {transaction.description} → {category}")
+        else:
+            unresolved.append(transaction)
+
+    resolved_count = len(grouped_transactions) - len(unresolved)
+    logger.info(f"🧠 Resolved {resolved_count} of {len(grouped_transactions)} groups from categorization history")
+    return unresolved
+
+
+class CategoryCache:
+    """
+    SQLite-backed cache of AI categories.
+
+    Entries are keyed by normalized description, model name and a hash of the
+    categorization prompt, so changing either the model or the prompt naturally
+    invalidates old answers. Entries older than max_age_days are dropped and the
+    least recently used ones are trimmed down to max_entries on close.
+    """
+
+    def __init__(self, path: str, model: str, prompt: str = CATEGORIZATION_PROMPT,
+                 max_age_days: float | None = DEFAULT_CACHE_MAX_AGE_DAYS,
+                 max_entries: int | None = DEFAULT_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.model = model
+        self.prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS categories (
+                description TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                category TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY (description, model, prompt_hash)
+            )
+        """)
+        self.connection.commit()
+
+    @staticmethod
+    def normalize(description: str) -> str:
+        return ' '.join(description.split()).casefold()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get_many(self, descriptions: list[str]) -> dict[str, str]:
+        """Return cached categories for the given descriptions, keyed by the original description."""
+        keys = {description: self.normalize(description) for description in descriptions}
+        unique_keys = list(set(keys.values()))
+        found = {}
+
+        for i in range(0, len(unique_keys), 500):
+            chunk = unique_keys[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT description, category FROM categories "
+                f"WHERE model = ? AND prompt_hash = ? AND description IN ({placeholders})",
+                [self.model, self.prompt_hash, *chunk]
+            ).fetchall()
+            found.update(rows)
+
+        self.connection.executemany(
+            "UPDATE categories SET last_used_at = ? WHERE description = ? AND model = ? AND prompt_hash = ?",
+            [(time.time(), key, self.model, self.prompt_hash) for key in found]
+        )
+        self.connection.commit()
+
+        result = {description: found[key] for description, key in keys.items() if key in found}
+        self.hits += len(result)
+        self.misses += len(descriptions) - len(result)
+        return result
+
+    def put_many(self, categories: dict[str, str]):
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO categories VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.normalize(description), self.model, self.prompt_hash, category, now, now)
+             for description, category in categories.items()]
+        )
+        self.connection.commit()
+
+    def evict(self) -> int:
+        """Apply age- and size-based eviction and return the number of removed entries."""
+        removed = 0
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            removed += self.connection.execute("DELETE FROM categories WHERE created_at < ?", (cutoff,)).rowcount
+        if self.max_entries is not None:
+            removed += self.connection.execute(
+                "DELETE FROM categories WHERE rowid NOT IN "
+                "(SELECT rowid FROM categories ORDER BY last_used_at DESC LIMIT ?)",
+                (self.max_entries,)
+            ).rowcount
+        self.connection.commit()
+        return removed
+
+    def close(self):
+        removed = self.evict()
+        if removed:
+            logger.debug(f"Evicted {removed} entries from category cache")
+        self.connection.close()
+
+
+async def _request_categories(descriptions: list[str], openai_client: "AsyncOpenAI", model: str) -> tuple[dict[str, str], int, int]:
+    """
+    Ask the model to categorize descriptions using the compact id protocol.
+
+    Each description is sent once as "<id>\\t<description>" and the model answers
+    with (id, category code) pairs only, which are mapped back locally. Returns the
+    description → category name map plus input and output token counts.
+    """
+    lines = [f"{i}\t{' '.join(description.split())}" for i, description in enumerate(descriptions)]
 
     response = await openai_client.responses.parse(
         model=model,
         instructions=CATEGORIZATION_PROMPT,
-        input=transactions_json,
+        input="\n".join(lines),
         temperature=0.0,
-        text_format=CategorizedTransactions,
+        text_format=CategorizedItems,
     )
 
-    categorized_results = response.output_parsed or []
+    categorized_results = response.output_parsed or CategorizedItems()
     
-    if len(categorized_results.transactions) != initial_count:
-        logger.warning(f"⚠️  Count mismatch: sent {initial_count} transactions, received {len(categorized_results.transactions)} categorized")
-    
-    category_map = {t.description: t.category for t in categorized_results.transactions}
+    if len(categorized_results.items) != len(descriptions):
+        logger.debug(f"Count mismatch: sent {len(descriptions)} transactions, received {len(categorized_results.items)} categorized")
+
+    usage = getattr(response, 'usage', None)
+    input_tokens = getattr(usage, 'input_tokens', 0) or 0
+    output_tokens = getattr(usage, 'output_tokens', 0) or 0
+
+    categories = {
+        descriptions[item.id]: CATEGORIES[item.code][0]
+        for item in categorized_results.items
+        if 0 <= item.id < len(descriptions)
+    }
+    return categories, input_tokens, output_tokens
+
+
+async def _categorize_in_chunks(descriptions: list[str], openai_client: "AsyncOpenAI", model: str,
+                                chunk_size: int, max_concurrency: int, max_retries: int) -> dict[str, str]:
+    """
+    Split descriptions into bounded chunks and categorize them concurrently.
+
+    At most max_concurrency requests are in flight. A chunk that raises is retried
+    whole; a chunk whose response misses descriptions is retried with only the
+    missing ones. Results from all chunks are merged into one category map.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    chunks = [descriptions[i:i + chunk_size] for i in range(0, len(descriptions), chunk_size)]
+    token_usage = [0, 0]
+
+    async def categorize_chunk(index: int, chunk: list[str]) -> dict[str, str]:
+        label = f"Chunk {index + 1}/{len(chunks)}"
+        pending = chunk
+        categories = {}
+
+        for attempt in range(max_retries + 1):
+            if attempt:
+                await asyncio.sleep(2 ** (attempt - 1))
+            try:
+                async with semaphore:
+                    response, input_tokens, output_tokens = await _request_categories(pending, openai_client, model)
+            except Exception as e:
+                logger.warning(f"⚠️  {label} failed (attempt {attempt + 1}/{max_retries + 1}): {e}")
+                continue
+
+            token_usage[0] += input_tokens
+            token_usage[1] += output_tokens
+            categories.update({d: response[d] for d in pending if d in response})
+            pending = [d for d in pending if d not in response]
+            if not pending:
+                break
+            logger.warning(f"⚠️  {label}: {len(pending)} descriptions missing from response (attempt {attempt + 1}/{max_retries + 1})")
+
+        logger.debug(f"{label} done: {len(categories)}/{len(chunk)} categorized")
+        return categories
+
+    category_map = {}
+    for categories in await asyncio.gather(*(categorize_chunk(i, chunk) for i, chunk in enumerate(chunks))):
+        category_map.update(categories)
+
+    logger.info(f"🔢 Categorization tokens: {token_usage[0]} input, {token_usage[1]} output")
+    return category_map
+
+
+async def categorize_transactions(grouped_transactions: list[GroupRecord], openai_client: "AsyncOpenAI", model: str,
+                                  cache: CategoryCache | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                  max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                                  max_retries: int = DEFAULT_MAX_RETRIES,
+                                  defaulted: list[GroupRecord] | None = None) -> list[GroupRecord]:
+    """
+    Categorize transactions using AI based on their descriptions, consulting the cache first.
+
+    Transactions the model gave no category for (including chunks that ran out of
+    retries) get DEFAULT_CATEGORY and are also appended to defaulted if given.
+    """
+    logger.info("🏷️ Categorizing transactions...")
+    initial_count = len(grouped_transactions)
+
+    descriptions = [t.description for t in grouped_transactions]
+    category_map = cache.get_many(descriptions) if cache else {}
+    uncached_descriptions = [description for description in descriptions if description not in category_map]
+
+    if cache:
+        logger.info(f"🗄️ {len(category_map)} transactions categorized from cache, {len(uncached_descriptions)} sent to AI")
+
+    if uncached_descriptions:
+        ai_categories = await _categorize_in_chunks(
+            uncached_descriptions, openai_client, model, chunk_size, max_concurrency, max_retries
+        )
+        if cache:
+            cache.put_many({d: ai_categories[d] for d in uncached_descriptions if d in ai_categories})
+        category_map.update(ai_categories)
+
     missing_descriptions = []
     
     for transaction in grouped_transactions:
         if transaction.description in category_map:
             transaction.category = category_map[transaction.description]
         else:
-            transaction.category = "Miscellaneous"
+            transaction.category = DEFAULT_CATEGORY
             missing_descriptions.append(transaction.description)
+            if defaulted is not None:
+                defaulted.append(transaction)
     
     if missing_descriptions:
-        logger.warning(f"⚠️  {len(missing_descriptions)} transactions not found in AI response, defaulted to 'Miscellaneous'")
+        logger.warning(f"⚠️  {len(missing_descriptions)} transactions not found in AI response, defaulted to '{DEFAULT_CATEGORY}'")
     
     final_count = len(grouped_transactions)
     if final_count != initial_count:
@@ -286,30 +1942,216 @@ async def categorize_transactions(grouped_transactions: list[GroupedTransaction]
     return grouped_transactions
 
 
-async def convert_currency_amounts(grouped_transactions: list[GroupedTransaction], target_currencies: list[str]) -> list[GroupedTransaction]:
-    """Convert all transaction amounts to target currencies."""
-    usd_rates = await get_exchange_rates("USD")
-    
-    for transaction in grouped_transactions:
-        total_usd = 0.0
-        for currency, amount in transaction.amounts.items():
-            if currency == "USD":
-                total_usd += amount
+class RateStore:
+    """
+    Historical USD-based exchange rates held as one dense day-indexed array per currency.
+
+    Bulk-loaded once for a date range, so converting a transaction at its own
+    date is an O(1) array lookup. Days without a published rate (weekends,
+    holidays) carry the previous known rate forward; days before the first known
+    rate use the first one. Dates outside the loaded range are clamped to its ends.
+    Currencies the history does not cover (the ECB publishes no BYN rate, for
+    example) are converted at fallback_rates, the latest rates, with a warning.
+    """
+
+    def __init__(self, daily_rates: dict[date, dict[str, float]]):
+        if not daily_rates:
+            raise ValueError("Exchange rate history is empty")
+        self.start = min(daily_rates)
+        self.end = max(daily_rates)
+        self.days = self.end.toordinal() - self.start.toordinal() + 1
+        self.clamped_lookups = 0
+        self._day_cache: dict[str, int] = {}
+        self._rates: dict[str, array] = {}
+        self.fallback_rates: dict[str, float] = {}
+
+        currencies = {currency for rates in daily_rates.values() for currency in rates}
+        for currency in currencies:
+            column = array('d', [math.nan]) * self.days
+            for day, rates in daily_rates.items():
+                if currency in rates:
+                    column[day.toordinal() - self.start.toordinal()] = float(rates[currency])
+            first_known = next(rate for rate in column if not math.isnan(rate))
+            previous = first_known
+            for index, rate in enumerate(column):
+                if math.isnan(rate):
+                    column[index] = previous
+                else:
+                    previous = rate
+            self._rates[currency] = column
+        self._rates.setdefault("USD", array('d', [1.0]) * self.days)
+
+    @property
+    def currencies(self) -> set[str]:
+        return set(self._rates) | set(self.fallback_rates)
+
+    @classmethod
+    def from_file(cls, path: str) -> "RateStore":
+        """Load rates from JSON ({"rates": {"YYYY-MM-DD": {"EUR": 0.92}}}) or CSV (date,currency,rate) per 1 USD."""
+        daily_rates = defaultdict(dict)
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith('.csv'):
+                for row in DictReader(f):
+                    daily_rates[date.fromisoformat(row['date'][:10])][row['currency'].upper()] = float(row['rate'])
             else:
-                rate_to_usd = 1.0 / usd_rates.get(currency, 1.0)  # 1 / rate because we need USD per foreign currency
-                total_usd += amount * rate_to_usd
+                for day, rates in json.load(f)['rates'].items():
+                    daily_rates[date.fromisoformat(day[:10])].update(rates)
+        return cls(daily_rates)
+
+    @staticmethod
+    async def download(path: str, start: date, end: date):
+        """Fetch USD-based daily rates for a date range in one request and save them as a JSON rate file."""
+        import httpx
+
+        async with httpx.AsyncClient(timeout=30) as client:
+            response = await client.get(FX_HISTORY_URL.format(start=start.isoformat(), end=end.isoformat()))
+            response.raise_for_status()
+            data = response.json()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'base': 'USD', 'rates': data['rates']}, f)
+        logger.info(f"💱 Downloaded {len(data['rates'])} days of exchange rates to {path}")
+
+    def day_index(self, timestamp: str) -> int:
+        # Keyed by day so the cache grows with distinct dates, not with per-second timestamps
+        day = timestamp[:10]
+        index = self._day_cache.get(day)
+        if index is None:
+            index = date.fromisoformat(day).toordinal() - self.start.toordinal()
+            if not 0 <= index < self.days:
+                self.clamped_lookups += 1
+                index = min(max(index, 0), self.days - 1)
+            self._day_cache[day] = index
+        return index
+
+    def _column(self, currency: str) -> array:
+        column = self._rates.get(currency)
+        if column is None:
+            rate = self.fallback_rates.get(currency)
+            if rate is None:
+                raise ValueError(f"No exchange rate history or latest rate for {currency}")
+            logger.warning(f"⚠️  Exchange rate history has no {currency} rates, converting {currency} at the latest rate ({rate:g} per USD)")
+            column = self._rates[currency] = array('d', [float(rate)]) * self.days
+        return column
+
+    def to_usd(self, amount: float, currency: str, day: int) -> float:
+        return amount if currency == "USD" else amount * (1.0 / self._column(currency)[day])
+
+    def from_usd(self, amount_usd: float, currency: str, day: int) -> float:
+        return amount_usd if currency == "USD" else amount_usd * self._column(currency)[day]
+
+
+def _convert_currency_amounts_python(store: GroupStore, target_currencies: list[str], usd_rates: dict[str, float]) -> GroupStore:
+    """Per-group conversion loop used when NumPy is not installed."""
+    currencies = sorted(store.currencies)
+    columns = [store.amounts[store.currency_codes[currency]] for currency in currencies]
+    to_usd = [1.0 if currency == "USD" else 1.0 / usd_rates[currency] for currency in currencies]  # USD per unit of currency
+    converted = [array('q') for _ in target_currencies]
+
+    for index in range(len(store)):
+        total_usd = 0.0
+        for column, rate_to_usd in zip(columns, to_usd):
+            total_usd += column[index] / AMOUNT_SCALE * rate_to_usd
         
-        converted_amounts = {}
-        for target_currency in target_currencies:
+        for target_currency, target_column in zip(target_currencies, converted):
             if target_currency == "USD":
-                converted_amounts[target_currency] = round(total_usd, 2)
+                target_column.append(round(round(total_usd, 2) * AMOUNT_SCALE))
             else:
-                rate = usd_rates.get(target_currency, 1.0)
-                converted_amounts[target_currency] = round(total_usd * rate, 2)
-        
-        transaction.converted_amounts = converted_amounts
+                target_column.append(round(round(total_usd * usd_rates[target_currency], 2) * AMOUNT_SCALE))
     
-    return grouped_transactions
+    store.set_converted(target_currencies, converted)
+    return store
+
+
+def _round_cents(np, values):
+    """
+    Round an array to 2 decimals exactly like the built-in round().
+
+    np.round scales by 100 and rounds, which can pick the other side of a
+    near-tie than round() does on the exact binary value. Such near-ties are rare,
+    so they are detected and re-rounded individually with the built-in.
+    """
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    near_ties = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for index in zip(*np.nonzero(near_ties)):
+        rounded[index] = round(float(values[index]), 2)
+    return rounded
+
+
+def convert_currency_amounts(store: GroupStore, target_currencies: list[str], usd_rates: dict[str, float]) -> GroupStore:
+    """
+    Convert all grouped amounts to target currencies using USD-based rates.
+
+    The store's fixed-point amount columns form a groups × source-currencies
+    matrix (scaled back to floats by NumPy) that is reduced to a USD column and
+    multiplied by the row of target rates in one batched operation. Results match
+    the per-group loop, including rounding.
+    """
+    missing_rates = sorted((set(store.currencies) | set(target_currencies)) - set(usd_rates) - {"USD"})
+    if missing_rates:
+        raise ValueError(f"No exchange rate available for: {', '.join(missing_rates)}")
+    
+    try:
+        import numpy as np
+    except ImportError:
+        return _convert_currency_amounts_python(store, target_currencies, usd_rates)
+    
+    # Accumulate column by column in a fixed currency order rather than with a
+    # matrix product, so every group sums with plain multiply-then-add like the loop.
+    total_usd = np.zeros(len(store))
+    for currency in sorted(store.currencies):
+        column = np.frombuffer(store.amounts[store.currency_codes[currency]], dtype=np.int64) / AMOUNT_SCALE
+        total_usd += column * (1.0 if currency == "USD" else 1.0 / usd_rates[currency])
+    
+    from_usd = np.array([1.0 if currency == "USD" else usd_rates[currency] for currency in target_currencies])
+    converted = np.rint(_round_cents(np, total_usd[:, None] * from_usd[None, :]) * AMOUNT_SCALE).astype(np.int64)
+    store.set_converted(target_currencies, [array('q', converted[:, j].tobytes()) for j in range(len(target_currencies))])
+    return store
+
+
+def _period_label(day: str, period: Period) -> str:
+    if period == Period.MONTH:
+        return day[:7]
+    if period == Period.WEEK:
+        year, week, _ = date.fromisoformat(day).isocalendar()
+        return f"{year}-W{week:02d}"
+    return day
+
+
+def rollup_periods(store: GroupStore, period: Period) -> GroupStore:
+    """
+    Roll a store's day-level period cube up to one row per period and group.
+
+    The result is a plain GroupStore keyed "period<separator>group key" and
+    ordered by period, then by the group's first appearance. Descriptions,
+    categories and comments come from the parent groups; converted amounts are
+    summed from the cube when it was filled with historical rates and are
+    otherwise left for convert_currency_amounts().
+    """
+    cube = store.periods
+    labels: dict[str, str] = {}
+    cells = []
+    for cell, cell_key in enumerate(cube.keys):
+        day, key = cell_key.split(PERIOD_KEY_SEPARATOR, 1)
+        label = labels.get(day)
+        if label is None:
+            label = labels[day] = _period_label(day, period)
+        cells.append((label, store.keys[key], cell, key))
+    cells.sort()
+
+    rollup = GroupStore(cube.target_currencies)
+    codes = [rollup.currency_code(currency) for currency in cube.currencies]
+    for label, parent, cell, key in cells:
+        index = rollup.group_index(f"{label}{PERIOD_KEY_SEPARATOR}{key}", store.descriptions[parent])
+        rollup.occurrences[index] += cube.occurrences[cell]
+        for code, column in zip(codes, cube.amounts):
+            rollup.amounts[code][index] += column[cell]
+        for column, cube_column in zip(rollup.converted, cube.converted):
+            column[index] += cube_column[cell]
+        rollup.categories[index] = store.categories[parent]
+        rollup.comments[index] = store.comments[parent]
+    return rollup
 
 
 def _prepare_export_data(grouped_transactions: list[GroupedTransaction]) -> tuple[list[dict], list[str]]:
@@ -327,6 +2169,9 @@ def _prepare_export_data(grouped_transactions: list[GroupedTransaction]) -> tupl
         for currency, amount in transaction.converted_amounts.items():
             row[f'Amount ({currency}, Aggregated)'] = round(amount, 2)
         
+        if transaction.original_descriptions:
+            row['Original Descriptions'] = ' | '.join(transaction.original_descriptions)
+        
         rows.append(row)
     
     # Get all unique field names with specific ordering
@@ -349,6 +2194,8 @@ def _prepare_export_data(grouped_transactions: list[GroupedTransaction]) -> tupl
         fieldnames = ['Description']
         fieldnames.extend(amount_fields)
         fieldnames.extend(['Occurrences', 'Category', 'Comment'])
+        if any('Original Descriptions' in row for row in rows):
+            fieldnames.append('Original Descriptions')
         
         # Ensure all rows have all fields (fill missing with empty string)
         for row in rows:
@@ -359,36 +2206,436 @@ def _prepare_export_data(grouped_transactions: list[GroupedTransaction]) -> tupl
     return rows, fieldnames
 
 
-def export_to_csv(grouped_transactions: list[GroupedTransaction], output_path: str):
-    """Export grouped transactions to CSV with flattened structure."""
-    logger.info(f"💾 Exporting results to {output_path}...")
-    
-    rows, fieldnames = _prepare_export_data(grouped_transactions)
-    
-    if rows:
-        # Write CSV
-        with open(output_path, 'w', newline='', encoding='utf-8') as f:
-            writer = DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
-        
-        logger.info(f"✅ Successfully exported {len(rows)} transactions to {output_path}")
-    else:
-        logger.warning("⚠️  No transactions to export")
+def _export_batch_rows(batches: Iterable[tuple[list[GroupedTransaction], list[str] | None]]) -> Iterator[tuple[list[dict], list[str]]]:
+    """Flatten each batch of grouped transactions, led by a Period column when the batch has period labels."""
+    for grouped_transactions, periods in batches:
+        rows, fieldnames = _prepare_export_data(grouped_transactions)
+        if rows and periods is not None:
+            for row, period in zip(rows, periods):
+                row['Period'] = period
+            fieldnames.insert(0, 'Period')
+        if rows:
+            yield rows, fieldnames
+
+
+def export_batches_to_csv(batches: Iterable[tuple[list[GroupedTransaction], list[str] | None]], output_path: str):
+    """
+    Stream batches of (grouped transactions, period labels or None) to one CSV.
+
+    Only one batch is held at a time; every batch of a run has the same columns,
+    so the first one decides the header.
+    """
+    logger.info(f"💾 Exporting results to {output_path}...")
+    
+    exported = 0
+    writer = None
+    with ExitStack() as stack:
+        for rows, fieldnames in _export_batch_rows(batches):
+            if writer is None:
+                f = stack.enter_context(open(output_path, 'w', newline='', encoding='utf-8'))
+                writer = DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+            writer.writerows(rows)
+            exported += len(rows)
+    
+    if exported:
+        logger.info(f"✅ Successfully exported {exported} transactions to {output_path}")
+    else:
+        logger.warning("⚠️  No transactions to export")
+
+
+def export_to_csv(grouped_transactions: list[GroupedTransaction], output_path: str, periods: list[str] | None = None):
+    """Export grouped transactions to CSV with flattened structure, led by a Period column when periods are given."""
+    export_batches_to_csv([(grouped_transactions, periods)], output_path)
+
+
+def export_batches_to_archive(batches: Iterable[tuple[list[GroupedTransaction], list[str] | None]], output_path: str):
+    """Stream batches like export_batches_to_csv() into one Parquet or Arrow IPC file, one row group or record batch each."""
+    pa = _import_pyarrow()
+    logger.info(f"💾 Exporting results to {output_path}...")
+    
+    exported = 0
+    writer = schema = None
+    try:
+        for rows, fieldnames in _export_batch_rows(batches):
+            table = pa.Table.from_pylist([{field: row[field] for field in fieldnames} for row in rows])
+            if writer is None:
+                schema = table.schema
+                if _archive_format(output_path) == 'parquet':
+                    import pyarrow.parquet as pq
+                    writer = pq.ParquetWriter(output_path, schema)
+                else:
+                    # Compressed like pyarrow.feather.write_feather()
+                    compression = 'lz4' if pa.Codec.is_available('lz4') else None
+                    writer = pa.ipc.new_file(output_path, schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+            writer.write_table(table.cast(schema))
+            exported += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    
+    if exported:
+        logger.info(f"✅ Successfully exported {exported} transactions to {output_path}")
+    else:
+        logger.warning("⚠️  No transactions to export")
+
+
+def export_to_archive(grouped_transactions: list[GroupedTransaction], output_path: str, periods: list[str] | None = None):
+    """Export grouped transactions with the CSV export's columns as a typed Parquet or Arrow IPC file."""
+    export_batches_to_archive([(grouped_transactions, periods)], output_path)
+
+
+def _sheet_properties(service, file_id: str, sheet_name: str) -> dict | None:
+    spreadsheet = service.spreadsheets().get(
+        spreadsheetId=file_id,
+        fields='sheets.properties(sheetId,title,gridProperties)'
+    ).execute()
+    return next((sheet['properties'] for sheet in spreadsheet['sheets'] if sheet['properties']['title'] == sheet_name), None)
+
+
+def _write_value_chunks(service, file_id: str, sheet_name: str, values: list[list], first_row: int = 0,
+                        chunk_rows: int = DEFAULT_SHEETS_CHUNK_ROWS, max_concurrency: int = DEFAULT_SHEETS_MAX_CONCURRENCY,
+                        max_retries: int = DEFAULT_SHEETS_MAX_RETRIES, http_factory: Callable[[], Any] | None = None):
+    """
+    Write rows starting at 0-based first_row as bounded ranges on a small thread pool.
+
+    Each chunk of at most chunk_rows rows is one values().update call. A failed
+    chunk is retried on its own with exponential backoff; the export fails only
+    if a chunk still fails after max_retries. The shared service only builds
+    requests, each worker thread executes them on its own HTTP connection from
+    http_factory because httplib2 connections are not thread-safe.
+    """
+    chunks = [(first_row + offset, values[offset:offset + chunk_rows]) for offset in range(0, len(values), chunk_rows)]
+    local = threading.local()
+    written_rows = 0
+
+    def write_chunk(row: int, chunk: list[list]):
+        if http_factory and not hasattr(local, 'http'):
+            local.http = http_factory()
+        label = f"Sheets rows {row + 1}-{row + len(chunk)}"
+        for attempt in range(max_retries + 1):
+            if attempt:
+                time.sleep(2 ** (attempt - 1))
+            try:
+                service.spreadsheets().values().update(
+                    spreadsheetId=file_id,
+                    range=f"{sheet_name}!A{row + 1}",
+                    valueInputOption='RAW',
+                    body={
+                        'values': chunk,
+                        'majorDimension': 'ROWS'
+                    }
+                ).execute(http=getattr(local, 'http', None))
+                return
+            except Exception as e:
+                logger.warning(f"⚠️  {label} failed (attempt {attempt + 1}/{max_retries + 1}): {e}")
+                if attempt == max_retries:
+                    raise RuntimeError(f"{label} could not be written after {max_retries + 1} attempts: {e}") from e
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {executor.submit(write_chunk, row, chunk): len(chunk) for row, chunk in chunks}
+        for done, future in enumerate(as_completed(futures), start=1):
+            future.result()
+            written_rows += futures[future]
+            if len(chunks) > 1:
+                logger.info(f"📤 Sheets: {done}/{len(chunks)} chunks written ({written_rows:,}/{len(values):,} rows)")
+
+
+def _write_sheet_rewrite(service, file_id: str, sheet_name: str, values: list[list], **chunk_options):
+    """Clear the sheet (creating it if needed) and write every row again in chunks."""
+    properties = _sheet_properties(service, file_id, sheet_name)
+    width = max(map(len, values), default=0)
+    if properties is None:
+        request_body = {
+            'requests': [{
+                'addSheet': {
+                    'properties': {
+                        'title': sheet_name,
+                        'gridProperties': {'rowCount': max(1000, len(values)), 'columnCount': max(26, width)}
+                    }
+                }
+            }]
+        }
+        service.spreadsheets().batchUpdate(spreadsheetId=file_id, body=request_body).execute()
+        logger.info(f"📋 Created new sheet: {sheet_name}")
+    else:
+        service.spreadsheets().values().clear(
+            spreadsheetId=file_id,
+            range=f"{sheet_name}!A:ZZ"
+        ).execute()
+        logger.info(f"🧹 Cleared existing data in sheet: {sheet_name}")
+        # Grow the grid up front so concurrent chunks never write past its end
+        resize_requests = _grid_resize_requests(properties, len(values), width)
+        if resize_requests:
+            service.spreadsheets().batchUpdate(spreadsheetId=file_id, body={'requests': resize_requests}).execute()
+    
+    _write_value_chunks(service, file_id, sheet_name, values, **chunk_options)
+
+
+def _grid_resize_requests(properties: dict, rows: int, columns: int) -> list[dict]:
+    grid = properties['gridProperties']
+    return [
+        {'appendDimension': {'sheetId': properties['sheetId'], 'dimension': dimension, 'length': needed - grid[count]}}
+        for dimension, count, needed in (('ROWS', 'rowCount', rows), ('COLUMNS', 'columnCount', columns))
+        if needed > grid[count]
+    ]
+
+
+def _cell_data(value) -> dict:
+    if value == '' or value is None:
+        return {}
+    if isinstance(value, (int, float)):
+        return {'userEnteredValue': {'numberValue': value}}
+    return {'userEnteredValue': {'stringValue': str(value)}}
+
+
+def _row_data(row: list, width: int) -> dict:
+    return {'values': [_cell_data(value) for value in row] + [{}] * (width - len(row))}
+
+
+def _padded(row: list, width: int) -> list:
+    return list(row) + [''] * (width - len(row))
+
+
+def _sheet_diff_requests(sheet_id: int, current: list[list], desired: list[list]) -> tuple[list[dict], int, list[list], int]:
+    """
+    Build batchUpdate requests turning the current sheet rows into the desired ones.
+
+    The header is row 0 and data rows are matched by Description (first column).
+    Changed rows are rewritten in place and rows that disappeared deleted
+    bottom-up so earlier indices stay valid. Returns the requests, the number
+    of updated rows, the new rows to append after the remaining ones and the
+    number of deleted rows.
+    """
+    width = max(map(len, current + desired), default=0)
+    current_rows = {}
+    deleted = []
+    for index, row in enumerate(current[1:], start=1):
+        description = row[0] if row else ''
+        if description in current_rows:
+            deleted.append(index)
+        else:
+            current_rows[description] = index
+
+    requests = []
+    appended = []
+    for index, row in enumerate(desired):
+        target = 0 if index == 0 else current_rows.pop(row[0], None)
+        if target is None:
+            appended.append(row)
+        elif target >= len(current) or _padded(current[target], width) != _padded(row, width):
+            requests.append({
+                'updateCells': {
+                    'start': {'sheetId': sheet_id, 'rowIndex': target, 'columnIndex': 0},
+                    'rows': [_row_data(row, width)],
+                    'fields': 'userEnteredValue'
+                }
+            })
+    updated = len(requests)
+
+    deleted = sorted(deleted + list(current_rows.values()), reverse=True)
+    ranges = []
+    for index in deleted:
+        if ranges and ranges[-1][0] == index + 1:
+            ranges[-1][0] = index
+        else:
+            ranges.append([index, index + 1])
+    requests.extend(
+        {
+            'deleteDimension': {
+                'range': {'sheetId': sheet_id, 'dimension': 'ROWS', 'startIndex': start, 'endIndex': end}
+            }
+        }
+        for start, end in ranges
+    )
+    return requests, updated, appended, len(deleted)
+
+
+def _write_sheet_diff(service, file_id: str, sheet_name: str, values: list[list], **chunk_options):
+    """
+    Read the sheet once and send only the row-level differences in a single batchUpdate.
+
+    New rows ride along in the same batch as appendCells unless there are more
+    than one chunk of them, as on a first export; those are written afterwards
+    as chunked range writes.
+    """
+    properties = _sheet_properties(service, file_id, sheet_name)
+    width = max(map(len, values), default=0)
+    requests = []
+    if properties is None:
+        # Pick the id up front so the rest of the batch can refer to the sheet it creates
+        sheet_id = int(hashlib.sha1(sheet_name.encode('utf-8')).hexdigest()[:7], 16)
+        properties = {
+            'sheetId': sheet_id,
+            'title': sheet_name,
+            'gridProperties': {'rowCount': max(1000, len(values)), 'columnCount': max(26, width)}
+        }
+        requests.append({'addSheet': {'properties': properties}})
+        current = []
+    else:
+        sheet_id = properties['sheetId']
+        current = service.spreadsheets().values().get(
+            spreadsheetId=file_id,
+            range=f"{sheet_name}!A:ZZ",
+            valueRenderOption='UNFORMATTED_VALUE'
+        ).execute().get('values', [])
+
+    diff_requests, updated, appended, deleted = _sheet_diff_requests(sheet_id, current, values)
+    if not diff_requests and not appended:
+        logger.info(f"✅ Google Sheets already up to date: {sheet_name}")
+        return
+
+    chunk_rows = chunk_options.get('chunk_rows', DEFAULT_SHEETS_CHUNK_ROWS)
+    first_appended_row = max(len(current), 1) - deleted
+    requests.extend(_grid_resize_requests(properties, max(len(current), 1) + len(appended), width))
+    requests.extend(diff_requests)
+    if 0 < len(appended) <= chunk_rows:
+        requests.append({
+            'appendCells': {
+                'sheetId': sheet_id,
+                'rows': [_row_data(row, width) for row in appended],
+                'fields': 'userEnteredValue'
+            }
+        })
+    if requests:
+        service.spreadsheets().batchUpdate(spreadsheetId=file_id, body={'requests': requests}).execute()
+    if len(appended) > chunk_rows:
+        _write_value_chunks(service, file_id, sheet_name, appended, first_appended_row, **chunk_options)
+    logger.info(f"📝 Sheets diff: {updated} rows updated, {len(appended)} appended, {deleted} deleted")
+
+
+class SheetsClient:
+    """
+    Google Sheets service built from a locally cached discovery document, with a reusable access token.
+
+    The discovery document is read from discovery_path, which is seeded from the
+    copy bundled with google-api-python-client (or fetched once) when missing.
+    Access tokens are cached per service account with their expiry and reused
+    while they have at least a few minutes left, so warm runs send their first
+    Sheets request without minting a token. Pass token_cache_path=None to skip it.
+    """
+
+    def __init__(self, credentials_path: str, discovery_path: str | None = DEFAULT_SHEETS_DISCOVERY,
+                 token_cache_path: str | None = DEFAULT_GOOGLE_TOKEN_CACHE):
+        from google.oauth2.service_account import Credentials
+        from googleapiclient.discovery import build, build_from_document
+
+        started = time.perf_counter()
+        self.credentials = Credentials.from_service_account_file(credentials_path, scopes=SHEETS_SCOPES)
+        self.token_cache_path = token_cache_path
+        self._cached_token = self._restore_token()
+        if discovery_path:
+            self.service = build_from_document(self._discovery_document(discovery_path), credentials=self.credentials)
+        else:
+            self.service = build('sheets', 'v4', credentials=self.credentials, cache_discovery=False)
+        logger.debug(f"Sheets client ready in {(time.perf_counter() - started) * 1000:.0f}ms (cached token: {self._cached_token is not None})")
+
+    @staticmethod
+    def _discovery_document(discovery_path: str) -> dict:
+        if os.path.exists(discovery_path):
+            try:
+                with open(discovery_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️  Ignoring unreadable Sheets discovery document {discovery_path}: {e}")
+
+        from googleapiclient.discovery_cache import get_static_doc
+
+        document = get_static_doc('sheets', 'v4')
+        if document is None:
+            import httpx
+
+            response = httpx.get(SHEETS_DISCOVERY_URL)
+            response.raise_for_status()
+            document = response.text
+        os.makedirs(os.path.dirname(os.path.abspath(discovery_path)), exist_ok=True)
+        temporary_path = f"{discovery_path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            f.write(document)
+        os.replace(temporary_path, discovery_path)
+        return json.loads(document)
+
+    def _token_cache(self) -> dict:
+        if not self.token_cache_path or not os.path.exists(self.token_cache_path):
+            return {}
+        try:
+            with open(self.token_cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if not isinstance(cache, dict):
+                raise ValueError("expected an object keyed by service account")
+            return cache
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Ignoring unreadable Google token cache {self.token_cache_path}: {e}")
+            return {}
+
+    def _restore_token(self) -> str | None:
+        entry = self._token_cache().get(self.credentials.service_account_email)
+        if not isinstance(entry, dict) or entry.get('scopes') != SHEETS_SCOPES:
+            return None
+        try:
+            token = entry['token']
+            # google-auth keeps expiry as a naive UTC datetime
+            expiry = datetime.fromisoformat(entry['expiry'])
+            if expiry.tzinfo is not None:
+                expiry = expiry.astimezone(timezone.utc).replace(tzinfo=None)
+            if not isinstance(token, str):
+                raise TypeError(f"token is {type(token).__name__}")
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"⚠️  Ignoring malformed Google token cache entry in {self.token_cache_path}: {e!r}")
+            return None
+        if (expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds() < GOOGLE_TOKEN_MIN_LIFETIME_SECONDS:
+            return None
+        self.credentials.token = token
+        self.credentials.expiry = expiry
+        return token
+
+    def ensure_token(self):
+        """Mint an access token now unless a cached one is still valid, and cache it."""
+        from google.auth.transport.requests import Request
+
+        if not self.credentials.valid:
+            self.credentials.refresh(Request())
+        self.store_token()
+
+    def store_token(self):
+        token = self.credentials.token
+        if not self.token_cache_path or not token or token == self._cached_token or not self.credentials.expiry:
+            return
+        cache = self._token_cache()
+        cache[self.credentials.service_account_email] = {
+            'token': token,
+            'expiry': self.credentials.expiry.isoformat(),
+            'scopes': SHEETS_SCOPES,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.token_cache_path)), exist_ok=True)
+        temporary_path = f"{self.token_cache_path}.tmp"
+        # Access tokens are bearer credentials, keep the cache private to the user
+        with open(os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(temporary_path, self.token_cache_path)
+        self._cached_token = token
+
+    def new_http(self) -> "AuthorizedHttp":
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+
+        return AuthorizedHttp(self.credentials, http=httplib2.Http())
 
 
-def export_to_sheets(grouped_transactions: list[GroupedTransaction], file_id: str, sheet_name: str, credentials_path: str):
-    """Export grouped transactions to Google Sheets."""
+def export_to_sheets(grouped_transactions: list[GroupedTransaction], file_id: str, sheet_name: str, client: SheetsClient,
+                     mode: SheetsMode = SheetsMode.REWRITE, chunk_rows: int = DEFAULT_SHEETS_CHUNK_ROWS,
+                     max_concurrency: int = DEFAULT_SHEETS_MAX_CONCURRENCY):
+    """
+    Export grouped transactions to Google Sheets.
+
+    In rewrite mode the sheet is cleared and every row written again in chunks
+    of chunk_rows on up to max_concurrency threads. In diff mode the current
+    values are read once and only changed, new and removed rows are sent,
+    keyed by Description, in a single batchUpdate.
+    """
     logger.info(f"📊 Exporting results to Google Sheets: {sheet_name}...")
     
     try:
-        # Authenticate with Google Sheets API
-        creds = Credentials.from_service_account_file(
-            credentials_path,
-            scopes=['https://www.googleapis.com/auth/spreadsheets']
-        )
-        service = build('sheets', 'v4', credentials=creds, cache_discovery=False)
-        
         # Prepare data
         rows, fieldnames = _prepare_export_data(grouped_transactions)
         
@@ -401,45 +2648,16 @@ def export_to_sheets(grouped_transactions: list[GroupedTransaction], file_id: st
         data_rows = [[row.get(field, '') for field in fieldnames] for row in rows]
         values = header_row + data_rows
         
-        # Check if sheet exists, create if it doesn't
-        spreadsheet = service.spreadsheets().get(spreadsheetId=file_id).execute()
-        sheet_exists = any(sheet['properties']['title'] == sheet_name for sheet in spreadsheet['sheets'])
-        
-        if not sheet_exists:
-            # Create new sheet
-            request_body = {
-                'requests': [{
-                    'addSheet': {
-                        'properties': {
-                            'title': sheet_name
-                        }
-                    }
-                }]
-            }
-            service.spreadsheets().batchUpdate(spreadsheetId=file_id, body=request_body).execute()
-            logger.info(f"📋 Created new sheet: {sheet_name}")
-        else:
-            # Clear existing data
-            range_name = f"{sheet_name}!A:ZZ"
-            service.spreadsheets().values().clear(
-                spreadsheetId=file_id,
-                range=range_name
-            ).execute()
-            logger.info(f"🧹 Cleared existing data in sheet: {sheet_name}")
-        
-        # Write data to sheet
-        range_name = f"{sheet_name}!A1"
-        body = {
-            'values': values,
-            'majorDimension': 'ROWS'
+        chunk_options = {
+            'chunk_rows': chunk_rows,
+            'max_concurrency': max_concurrency,
+            'http_factory': client.new_http
         }
-        
-        service.spreadsheets().values().update(
-            spreadsheetId=file_id,
-            range=range_name,
-            valueInputOption='RAW',
-            body=body
-        ).execute()
+        if mode == SheetsMode.DIFF:
+            _write_sheet_diff(client.service, file_id, sheet_name, values, **chunk_options)
+        else:
+            _write_sheet_rewrite(client.service, file_id, sheet_name, values, **chunk_options)
+        client.store_token()
         
         logger.info(f"✅ Successfully exported {len(rows)} transactions to Google Sheets: {sheet_name}")
         
@@ -448,6 +2666,53 @@ def export_to_sheets(grouped_transactions: list[GroupedTransaction], file_id: st
         raise
 
 
+class StageRunner:
+    """
+    Run named async stages as soon as their dependencies have finished.
+
+    Stages form a dependency graph: each stage is called with the results of its
+    dependencies, in the order they were declared, and independent stages run
+    concurrently on the event loop. Blocking work should be wrapped in
+    asyncio.to_thread by the stage itself. If any stage fails, the remaining
+    stages are cancelled and the error is re-raised.
+    """
+
+    def __init__(self):
+        self._stages: dict[str, tuple[Callable[..., Awaitable[Any]], tuple[str, ...]]] = {}
+
+    def add(self, name: str, function: Callable[..., Awaitable[Any]], *dependencies: str):
+        unknown = [dependency for dependency in dependencies if dependency not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage {name!r} depends on undeclared stages: {', '.join(unknown)}")
+        self._stages[name] = (function, dependencies)
+
+    async def run(self) -> dict[str, Any]:
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str) -> Any:
+            function, dependencies = self._stages[name]
+            inputs = [await tasks[dependency] for dependency in dependencies]
+            logger.info(f"▶️  Stage '{name}' started")
+            started = time.perf_counter()
+            try:
+                result = await function(*inputs)
+            except Exception as e:
+                logger.error(f"❌ Stage '{name}' failed after {time.perf_counter() - started:.2f}s: {e}")
+                raise
+            logger.info(f"⏹️  Stage '{name}' finished in {time.perf_counter() - started:.2f}s")
+            return result
+
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name), name=name)
+
+        try:
+            results = await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return dict(zip(tasks, results))
+
+
 def parse_arguments():
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(
@@ -464,14 +2729,67 @@ Examples:
     parser.add_argument(
         "--input",
         type=str,
+        nargs='+',
         required=True,
-        help="Path to input CSV file with transactions"
+        help="Input CSV files or .parquet/.arrow/.feather archives with transactions (globs allowed); several files are aggregated together"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes for reading input files and chunks of large files in parallel (default: number of CPUs)"
+    )
+    
+    parser.add_argument(
+        "--parse-chunk-mb",
+        type=int,
+        default=DEFAULT_PARSE_CHUNK_MB,
+        help=f"Split input files larger than this many MB into row-aligned chunks parsed in parallel (default: {DEFAULT_PARSE_CHUNK_MB})"
+    )
+    
+    parser.add_argument(
+        "--since",
+        type=str,
+        help="Only process transactions started on or after this date (YYYY-MM-DD)"
+    )
+    
+    parser.add_argument(
+        "--until",
+        type=str,
+        help="Only process transactions started on or before this date (YYYY-MM-DD)"
+    )
+    
+    parser.add_argument(
+        "--no-date-index",
+        action="store_true",
+        help="Scan whole inputs for --since/--until instead of using <input>.idx.json offset indexes"
+    )
+    
+    parser.add_argument(
+        "--periods",
+        type=str,
+        help="Also export per-period breakdowns, comma-separated from day, week, month (e.g. month,week); "
+             "all are rolled up from one pass over the input into <output>_<period>.csv"
+    )
+    
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=float,
+        help="Keep at most this much group data in memory and spill the rest to a temporary database that later stages stream from (reads inputs serially)"
+    )
+    
+    parser.add_argument(
+        "--archive",
+        type=str,
+        help="Convert the input CSV files into a typed Parquet (.parquet) or Arrow IPC (.arrow, .feather) archive at this path "
+             "and exit; archives can be passed to --input instead of CSV"
     )
     
     parser.add_argument(
         "--output",
         type=str,
-        help="Path to output CSV file (default: input file with '_processed' suffix)"
+        help="Path to output file, CSV or a .parquet/.arrow/.feather table by extension (default: input file with '_processed.csv' suffix)"
     )
     
     parser.add_argument(
@@ -494,12 +2812,163 @@ Examples:
         help=f"Comma-separated list of target currencies (default: {','.join(DEFAULT_CURRENCIES)})"
     )
     
+    parser.add_argument(
+        "--fx-cache",
+        type=str,
+        default=DEFAULT_FX_CACHE,
+        help=f"Path to exchange rate cache (default: {DEFAULT_FX_CACHE})"
+    )
+    
+    parser.add_argument(
+        "--fx-ttl-hours",
+        type=float,
+        default=DEFAULT_FX_TTL_HOURS,
+        help=f"Reuse cached exchange rates younger than this many hours (default: {DEFAULT_FX_TTL_HOURS})"
+    )
+    
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Never fetch exchange rates; use the last cached table"
+    )
+    
+    parser.add_argument(
+        "--fx-history",
+        type=str,
+        help="Daily USD-based rate file (JSON or CSV); converts each transaction at its completion date"
+    )
+    
+    parser.add_argument(
+        "--fx-history-range",
+        type=str,
+        help="START:END dates (YYYY-MM-DD) to download into --fx-history when the file does not exist yet"
+    )
+    
+    parser.add_argument(
+        "--ingest",
+        type=str,
+        choices=[mode.value for mode in IngestMode],
+        default=IngestMode.PYDANTIC.value,
+        help="CSV ingestion mode: per-row pydantic validation or batched columnar validation (default: pydantic)"
+    )
+    
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only process rows not seen in previous runs and merge them into the aggregates kept in the manifest"
+    )
+    
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        help="Manifest file for --incremental (default: output file with '.manifest.json' suffix)"
+    )
+    
+    parser.add_argument(
+        "--transfer-rules",
+        type=str,
+        help="Path to JSON file overriding internal transfer rules (internal_types, transfer_types, patterns, keywords)"
+    )
+    
+    parser.add_argument(
+        "--normalize-descriptions",
+        action="store_true",
+        help="Group by canonical merchant name with card suffixes, dates, order numbers and cities stripped"
+    )
+    
+    parser.add_argument(
+        "--normalization-rules",
+        type=str,
+        help="Path to JSON file overriding description normalization rules (strip_patterns, cities)"
+    )
+    
+    parser.add_argument(
+        "--merchant-index",
+        type=str,
+        help="Path to JSON list of known canonical merchant names used by description normalization"
+    )
+    
+    parser.add_argument(
+        "--merchant-rules",
+        type=str,
+        default=DEFAULT_MERCHANT_RULES,
+        help="Path to JSON file mapping categories to merchant substrings or 're:' regexes (default: merchant_rules.json next to main.py)"
+    )
+    
+    parser.add_argument(
+        "--no-merchant-rules",
+        action="store_true",
+        help="Do not categorize known merchants locally"
+    )
+    
+    parser.add_argument(
+        "--history",
+        type=str,
+        nargs='+',
+        help="Previously processed CSV files (globs allowed) to train the local nearest-neighbour categorizer from"
+    )
+    
+    parser.add_argument(
+        "--history-threshold",
+        type=float,
+        default=DEFAULT_HISTORY_THRESHOLD,
+        help=f"Minimum similarity for a history-based category; lower-confidence groups go to AI (default: {DEFAULT_HISTORY_THRESHOLD})"
+    )
+    
     parser.add_argument(
         "--skip-categorization",
         action="store_true",
         help="Skip AI categorization step (useful if API key is not available)"
     )
     
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"Maximum descriptions per categorization request (default: {DEFAULT_CHUNK_SIZE})"
+    )
+    
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help=f"Maximum concurrent categorization requests (default: {DEFAULT_MAX_CONCURRENCY})"
+    )
+    
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help=f"Retries for failed or incomplete categorization chunks (default: {DEFAULT_MAX_RETRIES})"
+    )
+    
+    parser.add_argument(
+        "--category-cache",
+        type=str,
+        default=DEFAULT_CATEGORY_CACHE,
+        help=f"Path to SQLite cache of AI categories (default: {DEFAULT_CATEGORY_CACHE})"
+    )
+    
+    parser.add_argument(
+        "--no-category-cache",
+        action="store_true",
+        help="Always send every description to the AI model"
+    )
+    
+    parser.add_argument(
+        "--cache-max-age-days",
+        type=float,
+        default=DEFAULT_CACHE_MAX_AGE_DAYS,
+        help=f"Evict cached categories older than this many days (default: {DEFAULT_CACHE_MAX_AGE_DAYS})"
+    )
+    
+    parser.add_argument(
+        "--cache-max-entries",
+        type=int,
+        default=DEFAULT_CACHE_MAX_ENTRIES,
+        help=f"Keep at most this many most recently used cached categories (default: {DEFAULT_CACHE_MAX_ENTRIES})"
+    )
+    
     parser.add_argument(
         "--debug",
         action="store_true",
@@ -524,13 +2993,55 @@ Examples:
         help="Path to Google service account credentials JSON file"
     )
     
+    parser.add_argument(
+        "--sheets-mode",
+        type=str,
+        choices=[mode.value for mode in SheetsMode],
+        default=SheetsMode.REWRITE.value,
+        help="Sheets write mode: clear and rewrite every row, or send only row-level changes keyed by Description (default: rewrite)"
+    )
+    
+    parser.add_argument(
+        "--sheets-chunk-rows",
+        type=int,
+        default=DEFAULT_SHEETS_CHUNK_ROWS,
+        help=f"Rows per Google Sheets range write (default: {DEFAULT_SHEETS_CHUNK_ROWS})"
+    )
+    
+    parser.add_argument(
+        "--sheets-max-concurrency",
+        type=int,
+        default=DEFAULT_SHEETS_MAX_CONCURRENCY,
+        help=f"Maximum concurrent Google Sheets range writes (default: {DEFAULT_SHEETS_MAX_CONCURRENCY})"
+    )
+    
+    parser.add_argument(
+        "--sheets-discovery",
+        type=str,
+        default=DEFAULT_SHEETS_DISCOVERY,
+        help=f"Cached Google Sheets API discovery document, created on first use (default: {DEFAULT_SHEETS_DISCOVERY})"
+    )
+    
+    parser.add_argument(
+        "--google-token-cache",
+        type=str,
+        default=DEFAULT_GOOGLE_TOKEN_CACHE,
+        help=f"Cache of Google access tokens reused until shortly before expiry (default: {DEFAULT_GOOGLE_TOKEN_CACHE})"
+    )
+    
+    parser.add_argument(
+        "--no-google-token-cache",
+        action="store_true",
+        help="Mint a fresh Google access token on every run"
+    )
+    
     return parser.parse_args()
 
 
 async def main():
     args = parse_arguments()
     
-    if not args.skip_categorization and not args.api_key:
+    if not args.skip_categorization and not args.api_key and not args.archive:
         logger.error("--api-key is required unless --skip-categorization is used")
         sys.exit(1)
     
@@ -544,66 +3055,336 @@ async def main():
     
     start_time = time.time()
     
+    # Date index sidecars and manifests written next to the inputs are never inputs themselves
+    input_paths = list(dict.fromkeys(
+        path for pattern in args.input
+        for path in sorted(path for path in glob.glob(pattern) if not path.endswith((DATE_INDEX_SUFFIX, MANIFEST_SUFFIX))) or [pattern]
+    ))
+    
     if args.output:
         output_path = args.output
     else:
-        output_path = args.input.replace('.csv', DEFAULT_OUTPUT_SUFFIX)
+        output_path = f"{os.path.splitext(input_paths[0])[0]}{DEFAULT_OUTPUT_SUFFIX}"
+    output_stem, output_extension = os.path.splitext(output_path)
+    # A glob like *.csv would otherwise pick up the previous run's output and period breakdowns
+    output_paths = {os.path.abspath(path) for path in [output_path, *(f"{output_stem}_{period.value}{output_extension}" for period in Period)]}
+    input_paths = [path for path in input_paths if os.path.abspath(path) not in output_paths]
+    missing_inputs = [path for path in input_paths if not os.path.exists(path)]
+    if missing_inputs or not input_paths:
+        logger.error(f"Input file not found: {', '.join(missing_inputs) or ' '.join(args.input)}")
+        sys.exit(1)
+    
+    if args.archive:
+        if _archive_format(args.archive) is None:
+            logger.error(f"--archive must end in one of: {', '.join(ARCHIVE_FORMATS)}")
+            sys.exit(1)
+        archive_start = time.time()
+        try:
+            count = await asyncio.to_thread(write_transaction_archive, input_paths, args.archive)
+        except ValueError as e:
+            logger.error(f"❌ Archive conversion failed: {e}")
+            sys.exit(1)
+        logger.info(f"🗜️  Archived {count} transactions to {args.archive} in {time.time() - archive_start:.2f}s")
+        return
     
     target_currencies = [currency.strip().upper() for currency in args.currencies.split(',')]
     
+    try:
+        # Normalized to YYYY-MM-DD, which the started dates are compared against as strings
+        args.since, args.until = (date.fromisoformat(bound).isoformat() if bound else None for bound in (args.since, args.until))
+    except ValueError:
+        logger.error("--since and --until take dates as YYYY-MM-DD")
+        sys.exit(1)
+    date_range = (args.since, args.until) if args.since or args.until else None
+    
+    try:
+        periods = list(dict.fromkeys(Period(period.strip().lower()) for period in args.periods.split(','))) if args.periods else []
+    except ValueError:
+        logger.error(f"--periods accepts a comma-separated list of: {', '.join(period.value for period in Period)}")
+        sys.exit(1)
+    
+    if args.incremental and args.memory_budget_mb:
+        logger.error("--memory-budget-mb cannot be combined with --incremental, the manifest keeps every group in memory")
+        sys.exit(1)
+    
+    history_files = sorted({path for pattern in args.history for path in glob.glob(pattern)}) if args.history else []
+    
+    manifest = None
+    manifest_path = args.manifest or f"{output_stem}{MANIFEST_SUFFIX}"
+    if args.incremental:
+        manifest = RunManifest.load(manifest_path, {
+            'target_currencies': target_currencies,
+            'fx_history': _file_digest(args.fx_history) if args.fx_history else None,
+            'transfer_rules': _file_digest(args.transfer_rules),
+            'normalize_descriptions': args.normalize_descriptions,
+            'normalization_rules': _file_digest(args.normalization_rules) if args.normalize_descriptions else None,
+            'merchant_index': _file_digest(args.merchant_index) if args.normalize_descriptions else None,
+            'periods': bool(periods),
+            'date_range': list(date_range) if date_range else None,
+            # Stored groups keep their categories, so everything that decides them is part of the settings
+            'skip_categorization': args.skip_categorization,
+            'merchant_rules': None if args.no_merchant_rules else _file_digest(args.merchant_rules),
+            'history': {path: _file_digest(path) for path in history_files},
+            'history_threshold': args.history_threshold if history_files else None,
+        })
+    
     openai_client = None
+    category_cache = None
     if not args.skip_categorization:
+        from openai import AsyncOpenAI
+
         openai_client = AsyncOpenAI(api_key=args.api_key)
+        if not args.no_category_cache:
+            category_cache = CategoryCache(
+                args.category_cache,
+                args.model,
+                max_age_days=args.cache_max_age_days,
+                max_entries=args.cache_max_entries
+            )
     
     logger.info("Transaction Processor")
     logger.info("=" * 50)
-    logger.info(f"Input file: {args.input}")
+    logger.info(f"Input files: {', '.join(input_paths)}" if len(input_paths) > 1 else f"Input file: {input_paths[0]}")
     logger.info(f"Output file: {output_path}")
     logger.info(f"Target currencies: {', '.join(target_currencies)}")
+    logger.info(f"Ingestion mode: {args.ingest}")
+    if date_range:
+        logger.info(f"Started dates: {args.since or '…'} – {args.until or '…'}")
+    if periods:
+        logger.info(f"Period breakdowns: {', '.join(period.value for period in periods)}")
     if args.skip_categorization:
         logger.info("AI categorization: DISABLED")
     else:
         logger.info(f"AI model: {args.model}")
     logger.info("=" * 50)
     
-    logger.info("📖 Reading transactions from CSV...")
-    transactions = read_transactions_from_csv(args.input)
-    
-    logger.info("🔍 Filtering external transactions...")
-    external_transactions = filter_external_transactions(transactions)
+    async def load_exchange_rates() -> "dict[str, float] | RateStore":
+        if not args.fx_history:
+            logger.info("💱 Loading exchange rates...")
+            return await get_exchange_rates("USD", args.fx_cache, args.fx_ttl_hours, args.offline)
+
+        if not os.path.exists(args.fx_history) and args.fx_history_range and not args.offline:
+            start, end = (date.fromisoformat(part) for part in args.fx_history_range.split(':'))
+            await RateStore.download(args.fx_history, start, end)
+        rate_store = RateStore.from_file(args.fx_history)
+        logger.info(f"💱 Loaded exchange rate history {rate_store.start} – {rate_store.end} for {len(rate_store.currencies)} currencies")
+        try:
+            rate_store.fallback_rates = await get_exchange_rates("USD", args.fx_cache, args.fx_ttl_hours, args.offline)
+        except RuntimeError as e:
+            logger.warning(f"⚠️  No latest exchange rates for currencies missing from the history: {e}")
+        missing_targets = sorted(set(target_currencies) - rate_store.currencies)
+        if missing_targets:
+            raise ValueError(f"Exchange rate history and latest rates have no rates for: {', '.join(missing_targets)}")
+        return rate_store
 
-    logger.info("📊 Grouping identical transactions...")
-    grouped_transactions = group_transactions_by_description(external_transactions)
+    def ingest(rate_store: RateStore | None = None) -> "GroupStore | GroupSpill":
+        logger.info("📖 Streaming transactions: read → filter → group...")
+        options = IngestOptions(
+            args.ingest, args.transfer_rules, args.normalize_descriptions, args.normalization_rules,
+            args.merchant_index, rate_store, tuple(target_currencies), bool(periods), args.since, args.until
+        )
+        if rate_store:
+            logger.info("💱 Converting each transaction at its completion date rate...")
 
-    logger.info("💱 Converting currencies...")
-    grouped_transactions = await convert_currency_amounts(grouped_transactions, target_currencies)
+        max_groups = None
+        if args.memory_budget_mb:
+            max_groups = max(1, int(args.memory_budget_mb * 1024 * 1024 / GROUP_MEMORY_ESTIMATE_BYTES))
+        serial = manifest is not None or max_groups is not None
+        tasks = plan_ingest_tasks(input_paths, args.parse_chunk_mb * 1024 * 1024, split=args.workers > 1 and not serial,
+                                  date_range=None if args.no_date_index else date_range)
+        workers = min(args.workers, len(tasks))
+        if workers > 1 and not serial:
+            logger.info(f"⚙️  Aggregating {len(input_paths)} file(s) as {len(tasks)} chunks on {workers} worker processes")
+            group_store, clamped_lookups = aggregate_in_parallel(tasks, options, workers)
+        else:
+            transactions = chain.from_iterable(options.read(*task) for task in tasks)
+            if manifest:
+                transactions = manifest.skip_processed(transactions)
+            external_transactions = filter_external_transactions(transactions, options.classifier())
+            previous_store = manifest.store if manifest else None
+            group_store = group_transactions_by_description(external_transactions, options.normalizer(), rate_store,
+                                                            target_currencies, previous_store, max_groups, bool(periods))
+            clamped_lookups = rate_store.clamped_lookups if rate_store else 0
 
-    if not args.skip_categorization:
-        grouped_transactions = await categorize_transactions(grouped_transactions, openai_client, args.model)
-    else:
-        logger.info("⏭️  Skipping AI categorization...")
-    
-    logger.info("=" * 50)
-    logger.info("✨ Transaction processing complete!")
-    logger.info(f"📊 Total unique transactions: {len(grouped_transactions)}")
-    
-    if not args.skip_categorization:
-        category_counts = defaultdict(int)
-        for transaction in grouped_transactions:
-            category_counts[transaction.category] += 1
+        if clamped_lookups:
+            logger.warning(f"⚠️  {clamped_lookups} transaction dates fall outside the rate history ({rate_store.start} – {rate_store.end}) and used the nearest available rate")
+        return group_store
+
+    async def convert(group_store: "GroupStore | GroupSpill", rates: "dict[str, float] | RateStore"):
+        # Spilled groups are converted batch by batch as they are exported
+        if not isinstance(rates, RateStore) and not isinstance(group_store, GroupSpill):
+            logger.info("💱 Converting currencies...")
+            convert_currency_amounts(group_store, target_currencies, rates)
+
+    # Groups given the default category because the model returned none; not persisted as categorized
+    defaulted_groups: list[GroupRecord] = []
+
+    async def categorize_records(records: list[GroupRecord], merchant_rules: MerchantRuleEngine | None,
+                                 history_classifier: HistoryClassifier | None):
+        uncategorized_transactions = [record for record in records if not record.category]
+        if merchant_rules:
+            uncategorized_transactions = apply_merchant_rules(uncategorized_transactions, merchant_rules)
+
+        if history_classifier and uncategorized_transactions:
+            uncategorized_transactions = apply_history_classifier(uncategorized_transactions, history_classifier, args.history_threshold)
+
+        if args.skip_categorization:
+            return
+        if not uncategorized_transactions:
+            logger.info("⏭️  All groups resolved locally, skipping AI categorization")
+        else:
+            await categorize_transactions(
+                uncategorized_transactions,
+                openai_client,
+                args.model,
+                category_cache,
+                chunk_size=args.chunk_size,
+                max_concurrency=args.max_concurrency,
+                max_retries=args.max_retries,
+                defaulted=defaulted_groups if manifest else None
+            )
+
+    async def categorize(group_store: "GroupStore | GroupSpill"):
+        merchant_rules = None
+        if not args.no_merchant_rules and os.path.exists(args.merchant_rules):
+            merchant_rules = MerchantRuleEngine.from_file(args.merchant_rules)
+
+        history_classifier = None
+        if args.history:
+            history_classifier = HistoryClassifier.from_files(history_files)
+            logger.info(f"🧠 Trained history categorizer on {len(history_classifier)} descriptions from {len(history_files)} file(s)")
+
+        if args.skip_categorization:
+            logger.info("⏭️  Skipping AI categorization...")
+        if not isinstance(group_store, GroupSpill):
+            await categorize_records(group_store.records(), merchant_rules, history_classifier)
+        elif merchant_rules or history_classifier or not args.skip_categorization:
+            batches = group_store.batches()
+            while (batch := await asyncio.to_thread(next, batches, None)) is not None:
+                await categorize_records(batch.records(), merchant_rules, history_classifier)
+                await asyncio.to_thread(group_store.store_categories, batch)
+
+    async def summarize(group_store: "GroupStore | GroupSpill", *_) -> "list[GroupedTransaction] | GroupSpill":
+        logger.info("=" * 50)
+        logger.info("✨ Transaction processing complete!")
+        logger.info(f"📊 Total unique transactions: {len(group_store)}")
         
-        logger.info("📁 Categories breakdown:")
-        for category, count in sorted(category_counts.items()):
-            logger.info(f"   • {category}: {count}")
-    
-    export_to_csv(grouped_transactions, output_path)
-    
-    if args.sheets_file_id and args.sheets_name and args.google_credentials:
+        if isinstance(group_store, GroupSpill):
+            stored_counts = await asyncio.to_thread(group_store.category_counts)
+        else:
+            stored_counts = Counter(group_store.categories)
+        if any(stored_counts):
+            category_counts = defaultdict(int)
+            for category, count in stored_counts.items():
+                category_counts[category or "Uncategorized"] += count
+            
+            logger.info("📁 Categories breakdown:")
+            for category, count in sorted(category_counts.items()):
+                logger.info(f"   • {category}: {count}")
+        
+        if category_cache:
+            logger.info(f"🗄️ Category cache: {category_cache.hits} hits, {category_cache.misses} misses ({category_cache.hit_rate:.0%} hit rate)")
+            category_cache.close()
+        
+        if isinstance(group_store, GroupSpill):
+            return group_store
+        return group_store.to_grouped_transactions()
+
+    archive_output = _archive_format(output_path) is not None
+    export_results = export_to_archive if archive_output else export_to_csv
+    export_batches = export_batches_to_archive if archive_output else export_batches_to_csv
+
+    def spill_batches(spill: GroupSpill, rates: "dict[str, float] | RateStore", table: str = GroupSpill.RESULT) -> Iterator[GroupStore]:
+        for batch in spill.batches(table):
+            if not isinstance(rates, RateStore):
+                convert_currency_amounts(batch, target_currencies, rates)
+            yield batch
+
+    def export_spill(spill: GroupSpill, rates: "dict[str, float] | RateStore"):
+        export_batches(((batch.to_grouped_transactions(), None) for batch in spill_batches(spill, rates)), output_path)
+
+    async def write_csv(grouped_transactions: "list[GroupedTransaction] | GroupSpill", rates: "dict[str, float] | RateStore"):
+        if isinstance(grouped_transactions, GroupSpill):
+            await asyncio.to_thread(export_spill, grouped_transactions, rates)
+        else:
+            await asyncio.to_thread(export_results, grouped_transactions, output_path)
+
+    def export_periods(group_store: "GroupStore | GroupSpill", rates: "dict[str, float] | RateStore"):
+        for period in periods:
+            period_path = f"{output_stem}_{period.value}{output_extension}"
+            if isinstance(group_store, GroupSpill):
+                table = group_store.rollup(period)
+                logger.info(f"🗓️  Rolled up {len(group_store)} spilled groups into {period.value} rows")
+                export_batches((
+                    (batch.to_grouped_transactions(), [key.split(PERIOD_KEY_SEPARATOR, 1)[0] for key in batch.keys])
+                    for batch in spill_batches(group_store, rates, table)
+                ), period_path)
+                continue
+            rollup = rollup_periods(group_store, period)
+            if not isinstance(rates, RateStore):
+                convert_currency_amounts(rollup, target_currencies, rates)
+            labels = [key.split(PERIOD_KEY_SEPARATOR, 1)[0] for key in rollup.keys]
+            logger.info(f"🗓️  Rolled up {len(group_store)} groups into {len(rollup)} {period.value} rows across {len(set(labels))} periods")
+            export_results(rollup.to_grouped_transactions(), period_path, labels)
+
+    async def write_periods(group_store: "GroupStore | GroupSpill", rates: "dict[str, float] | RateStore", _):
+        await asyncio.to_thread(export_periods, group_store, rates)
+
+    def connect_sheets() -> SheetsClient:
+        client = SheetsClient(args.google_credentials, args.sheets_discovery, None if args.no_google_token_cache else args.google_token_cache)
+        client.ensure_token()
+        return client
+
+    async def prepare_sheets_client() -> SheetsClient | None:
+        try:
+            return await asyncio.to_thread(connect_sheets)
+        except Exception as e:
+            logger.error(f"❌ Google Sheets authentication failed: {e}")
+            return None
+
+    async def write_sheets(grouped_transactions: "list[GroupedTransaction] | GroupSpill", rates: "dict[str, float] | RateStore",
+                           client: SheetsClient | None):
+        if client is None:
+            logger.info("💡 Skipping Google Sheets export, CSV export is unaffected")
+            return
+        if isinstance(grouped_transactions, GroupSpill):
+            # A sheet is written as a whole, so spilled groups are loaded for it
+            grouped_transactions = [transaction for batch in spill_batches(grouped_transactions, rates)
+                                    for transaction in batch.to_grouped_transactions()]
         try:
-            export_to_sheets(grouped_transactions, args.sheets_file_id, args.sheets_name, args.google_credentials)
+            await asyncio.to_thread(export_to_sheets, grouped_transactions, args.sheets_file_id, args.sheets_name, client,
+                                    SheetsMode(args.sheets_mode), args.sheets_chunk_rows, args.sheets_max_concurrency)
         except Exception as e:
             logger.error(f"❌ Google Sheets export failed: {e}")
-            logger.info("💡 CSV export was successful, continuing...")
+            logger.info("💡 CSV export is unaffected, continuing...")
+
+    async def save_manifest(group_store: GroupStore, _):
+        await asyncio.to_thread(manifest.save, manifest_path, group_store, [record.index for record in defaulted_groups])
+
+    runner = StageRunner()
+    runner.add("rates", load_exchange_rates)
+    if args.fx_history:
+        runner.add("ingest", lambda rate_store: asyncio.to_thread(ingest, rate_store), "rates")
+    else:
+        runner.add("ingest", lambda: asyncio.to_thread(ingest))
+    runner.add("convert", convert, "ingest", "rates")
+    runner.add("categorize", categorize, "ingest")
+    runner.add("summary", summarize, "ingest", "convert", "categorize")
+    runner.add("export_csv", write_csv, "summary", "rates")
+    if periods:
+        runner.add("export_periods", write_periods, "ingest", "rates", "categorize")
+    if args.sheets_file_id and args.sheets_name and args.google_credentials:
+        runner.add("sheets_client", prepare_sheets_client)
+        runner.add("export_sheets", write_sheets, "summary", "rates", "sheets_client")
+    if manifest:
+        runner.add("manifest", save_manifest, "ingest", "export_csv")
+
+    try:
+        results = await runner.run()
+    except (RuntimeError, ValueError):
+        sys.exit(1)
+    if isinstance(results["ingest"], GroupSpill):
+        results["ingest"].close()
     
     elapsed_time = time.time() - start_time
     logger.info(f"⏱️  Total processing time: {elapsed_time:.2f} seconds")